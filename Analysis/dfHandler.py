@@ -4,6 +4,7 @@ import numpy as np
 import pandas as pd
 
 from Logging.MyLogger import MyLogger
+from MongoDB.DFMirrorCache import DFMirrorCache
 from MongoDB.MongoDownload import MongoDownload
 from MongoDB.MongoUpload import MongoUploadDF
 
@@ -152,11 +153,13 @@ class dfHandler:
         return year_course_hole_round
 
     def __init__(self, mongo_obj, tournament_name_scrape, tournament_name_sg, force_create_sg=False,
-                 force_create_tournament=False):
+                 force_create_tournament=False, use_mirror=True):
+        """use_mirror reads the tournament and raw SG DFs through the local Parquet mirror, only DF documents
+        that changed in MongoDB are downloaded"""
         self._logger = MyLogger('dfHandler', 'Analysis/logs/dfHandler.log', logging.INFO).getLogger()
         self._tournament_name = tournament_name_scrape
         self._mongo_obj = mongo_obj
-        mongo_download = MongoDownload(self._mongo_obj)
+        mongo_download = MongoDownload(self._mongo_obj, DFMirrorCache() if use_mirror else None)
         self._mongo_upload_df = MongoUploadDF(self._mongo_obj.getTournamentDB(), self._tournament_name)
         self._raw_sg_df = pd.DataFrame(mongo_download.getRawSG_DF(tournament_name_scrape))
         if self._raw_sg_df.empty or force_create_sg:
@@ -278,14 +281,13 @@ class dfHandler:
         for course, course_tournament_df in self._tournament_df.groupby('courseID'):
             for year, year_tournament_df in course_tournament_df.groupby('pgaYear'):
                 for round_num, round_tournament_df in year_tournament_df.groupby('roundNum'):
-                    df_dict = round_tournament_df.drop(columns='shottext').to_dict('records')
                     upload_dict = {'tournamentName': self._tournament_name, 'courseID': course,
-                                   'pgaYear': year, 'roundNum': round_num, 'df': df_dict}
+                                   'pgaYear': year, 'roundNum': round_num,
+                                   'df': round_tournament_df.drop(columns='shottext')}
                     self._mongo_upload_df.uploadTournamentDF(upload_dict)
 
     def uploadRawSG_DF(self):
         for year, year_tournament_df in self._raw_sg_df.groupby('pgaYear'):
-            df_dict = year_tournament_df.to_dict('records')
             upload_dict = {'tournamentName': self._tournament_name,
-                           'pgaYear': year, 'df': df_dict}
+                           'pgaYear': year, 'df': year_tournament_df}
             self._mongo_upload_df.uploadRawSG_DF(upload_dict)
\ No newline at end of file
@@ -0,0 +1,61 @@
+class DrawerPlanner:
+    """Plan the round detail (drawer) requests for a tournament. One drawer holds every player in the group,
+    so only one request per group is needed. Groups seen in earlier drawers are remembered and
+    reused to predict the pairings of a paired round (round 2 keeps the round 1 groups)"""
+
+    def __init__(self, player_rounds_played, unknown_wave_size=8, group_size=3, paired_rounds=None):
+        """Initialize with dict of player ID to round numbers played, unknown_wave_size bounds the requests
+        per round and wave for players whose group isn't known yet"""
+        self._player_rounds_played = player_rounds_played
+        self._unknown_wave_size = unknown_wave_size
+        self._group_size = group_size
+        self._paired_rounds = paired_rounds if paired_rounds is not None else {'2': '1'}
+        self._round_groups = {}
+        self._attempted = set()
+
+    def __repr__(self):
+        return self.__class__.__name__ + ': {} requests attempted, groups known for rounds {}'.format(
+            len(self._attempted), sorted(self._round_groups.keys()))
+
+    def addGroup(self, round_num, player_ids):
+        """Record a group seen in a drawer"""
+        group = frozenset(player_ids)
+        for player_id in group:
+            self._round_groups.setdefault(round_num, {})[player_id] = group
+
+    def markAttempted(self, player_id, round_num):
+        self._attempted.add((player_id, round_num))
+
+    def _getGroup(self, player_id, round_num):
+        """Known group for the round, else the group from the paired round, else None"""
+        group = self._round_groups.get(round_num, {}).get(player_id)
+        if group is None and round_num in self._paired_rounds:
+            group = self._round_groups.get(self._paired_rounds[round_num], {}).get(player_id)
+        return group
+
+    def planRequests(self, player_round_dict):
+        """Return the next wave of (player ID, round number) requests covering uncovered player rounds,
+        a player round is never planned twice so the planner always runs out"""
+        planned = []
+        rounds = sorted({round_num for round_nums in self._player_rounds_played.values() for round_num in round_nums},
+                        key=int)
+        for round_num in rounds:
+            planned_groups = set()
+            unknown_players = []
+            for player_id, round_nums in self._player_rounds_played.items():
+                if round_num not in round_nums or (player_id, round_num) in self._attempted:
+                    continue
+                if player_id in player_round_dict and round_num in player_round_dict[player_id]:
+                    continue
+                group = self._getGroup(player_id, round_num)
+                if group is None:
+                    unknown_players.append(player_id)
+                elif group not in planned_groups:
+                    planned_groups.add(group)
+                    planned.append((player_id, round_num))
+            # fewer unknown requests as the round fills up, the last few groups would otherwise collide in one wave
+            num_unknown = min(self._unknown_wave_size, -(-len(unknown_players) // self._group_size))
+            planned.extend((player_id, round_num) for player_id in unknown_players[:num_unknown])
+        for player_id, round_num in planned:
+            self.markAttempted(player_id, round_num)
+        return planned
@@ -0,0 +1,140 @@
+import logging
+import random
+import threading
+import time
+
+from Logging.MyLogger import MyLogger
+
+
+class HostRateLimiter:
+    """Token bucket per host shared by every fetcher. The rate is tuned with AIMD, it grows by a constant after
+    every fast success and is cut by a factor on a throttle, error or slow response. A host that keeps failing
+    trips its circuit breaker and every request to it waits out a cooldown, a single probe request then decides
+    whether the circuit closes again or the cooldown doubles"""
+
+    def __init__(self, initial_rate=4.0, min_rate=.5, max_rate=40.0, additive_increase=.25,
+                 multiplicative_decrease=.5, target_latency=2.0, burst=4, failure_threshold=5, cooldown=15.0,
+                 max_cooldown=240.0, base_backoff=.5, max_backoff=30.0):
+        """Initialize limiter, rates are in requests per second, latencies and cooldowns in seconds"""
+        self._initial_rate = initial_rate
+        self._min_rate = min_rate
+        self._max_rate = max_rate
+        self._additive_increase = additive_increase
+        self._multiplicative_decrease = multiplicative_decrease
+        self._target_latency = target_latency
+        self._burst = burst
+        self._failure_threshold = failure_threshold
+        self._cooldown = cooldown
+        self._max_cooldown = max_cooldown
+        self._base_backoff = base_backoff
+        self._max_backoff = max_backoff
+        self._host_stats = {}
+        self._lock = threading.Lock()
+        self._logger = MyLogger(self.__class__.__name__, None, logging.INFO).getLogger()
+
+    def __repr__(self):
+        return self.__class__.__name__ + ': {}'.format(
+            {host: '{:.2f}/s'.format(stats['rate']) for host, stats in self._host_stats.items()})
+
+    def _getStats(self, host):
+        stats = self._host_stats.get(host)
+        if stats is None:
+            stats = {'rate': self._initial_rate, 'tokens': float(self._burst), 'refilled': time.monotonic(),
+                     'decreased': 0.0, 'latency': 0.0, 'failures': 0, 'open_until': 0.0, 'cooldown': self._cooldown,
+                     'probing': False, 'successes': 0, 'throttled': 0, 'trips': 0}
+            self._host_stats[host] = stats
+        return stats
+
+    def _refillTokens(self, stats, now):
+        stats['tokens'] = min(float(self._burst), stats['tokens'] + (now - stats['refilled']) * stats['rate'])
+        stats['refilled'] = now
+
+    def tryAcquire(self, host):
+        """Take a request to host if it is allowed now, return 0 if it was or the seconds to wait before asking
+        again, a RequestScheduler requeues the request for that long instead of holding a worker"""
+        with self._lock:
+            stats = self._getStats(host)
+            now = time.monotonic()
+            self._refillTokens(stats, now)
+            if now < stats['open_until']:
+                return stats['open_until'] - now
+            if stats['open_until'] and stats['probing']:
+                # circuit half open, everyone else waits for the probe
+                return .1
+            if stats['tokens'] >= 1:
+                stats['tokens'] -= 1
+                if stats['open_until']:
+                    stats['probing'] = True
+                return 0.0
+            return (1 - stats['tokens']) / stats['rate']
+
+    def acquire(self, host):
+        """Block until a request to host is allowed"""
+        while True:
+            wait = self.tryAcquire(host)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def reportResult(self, host, latency, success):
+        """Tune the host's rate from an observed request, success is False for throttles, server errors and timeouts"""
+        with self._lock:
+            stats = self._getStats(host)
+            now = time.monotonic()
+            stats['latency'] = latency
+            if success:
+                stats['successes'] += 1
+                stats['failures'] = 0
+                if stats['open_until']:
+                    self._logger.info('Closing circuit for {}'.format(host))
+                    stats['open_until'] = 0.0
+                    stats['probing'] = False
+                    stats['cooldown'] = self._cooldown
+                if latency > self._target_latency:
+                    self._decreaseRate(stats, now)
+                else:
+                    stats['rate'] = min(self._max_rate, stats['rate'] + self._additive_increase)
+                return
+
+            stats['throttled'] += 1
+            stats['failures'] += 1
+            self._decreaseRate(stats, now)
+            if stats['probing']:
+                # the half open probe failed, wait twice as long before the next one
+                stats['cooldown'] = min(self._max_cooldown, stats['cooldown'] * 2)
+                self._openCircuit(host, stats, now)
+            elif not stats['open_until'] and stats['failures'] >= self._failure_threshold:
+                # failures of requests in flight when the circuit opened don't open it again
+                self._openCircuit(host, stats, now)
+
+    def releaseProbe(self, host):
+        """A request that says nothing about the host finished, e.g. its proxy failed. If it was the half open probe
+        the next request probes instead, the rate and failure count are left alone"""
+        with self._lock:
+            self._getStats(host)['probing'] = False
+
+    def _openCircuit(self, host, stats, now):
+        stats['trips'] += 1
+        stats['open_until'] = now + stats['cooldown']
+        stats['probing'] = False
+        stats['tokens'] = 0.0
+        self._logger.warning('Opening circuit for {} for {:.1f}s after {} failures'.format(
+            host, stats['cooldown'], stats['failures']))
+
+    def _decreaseRate(self, stats, now):
+        # requests already in flight report the same congestion, cut the rate at most once per round trip
+        if now - stats['decreased'] < max(stats['latency'], 1 / stats['rate']):
+            return
+        stats['decreased'] = now
+        stats['rate'] = max(self._min_rate, stats['rate'] * self._multiplicative_decrease)
+
+    def getBackoff(self, attempt, retry_after=None):
+        """Full jitter exponential backoff in seconds before retry number attempt, at least retry_after if given"""
+        backoff = random.uniform(0, min(self._max_backoff, self._base_backoff * 2 ** attempt))
+        if retry_after is not None:
+            backoff = max(backoff, min(self._max_backoff, retry_after))
+        return backoff
+
+    def getHostStats(self):
+        with self._lock:
+            return {host: dict(stats) for host, stats in self._host_stats.items()}
@@ -0,0 +1,94 @@
+import threading
+
+
+def findKeyPath(json_body, key):
+    """Depth first search in nested_lookup order, return the path of dict keys and list indices
+    to the first value stored under key, None if the key is nowhere in the document"""
+    if isinstance(json_body, list):
+        for i, item in enumerate(json_body):
+            path = findKeyPath(item, key)
+            if path is not None:
+                return (i,) + path
+    elif isinstance(json_body, dict):
+        for k, v in json_body.items():
+            if k == key:
+                return (k,)
+            if isinstance(v, (dict, list)):
+                path = findKeyPath(v, key)
+                if path is not None:
+                    return (k,) + path
+    return None
+
+
+class JSONExtractor:
+    """Resolve a fixed set of keys from one endpoint's JSON. Paths are learned from the first document with a
+    full search and compiled into a trie, after that every key is resolved in a single walk over only the
+    compiled branches. A compiled path that goes missing is schema drift, that key alone falls back to a full
+    search and its path is recompiled"""
+
+    def __init__(self, keys):
+        """Initialize with the keys to extract"""
+        self._keys = list(keys)
+        self._lock = threading.Lock()
+        self._key_paths = {}
+        self._trie = None
+        self.drift_count = 0
+
+    def __repr__(self):
+        return self.__class__.__name__ + ' {} with {} schema drifts'.format(self._key_paths, self.drift_count)
+
+    def getKeys(self):
+        return list(self._keys)
+
+    def _compileTrie(self):
+        """Each node is [keys whose value is here, dict of path step to child node, every key below the node]"""
+        trie = [[], {}, []]
+        for key, path in self._key_paths.items():
+            node = trie
+            node[2].append(key)
+            for step in path:
+                node = node[1].setdefault(step, [[], {}, []])
+                node[2].append(key)
+            node[0].append(key)
+        self._trie = trie
+
+    def _walkTrie(self, node, json_body, values, missing_keys):
+        for key in node[0]:
+            values[key] = json_body
+        for step, child in node[1].items():
+            try:
+                child_body = json_body[step]
+            except (KeyError, IndexError, TypeError):
+                missing_keys.extend(child[2])
+                continue
+            self._walkTrie(child, child_body, values, missing_keys)
+
+    def extract(self, json_body, called_from_logger=None):
+        """Return dict of key to the value nested_lookup would have found first, KeyError if a key is nowhere,
+        optional logger for schema drift warnings"""
+        values = {}
+        missing_keys = [key for key in self._keys if key not in self._key_paths]
+        if self._trie is not None:
+            self._walkTrie(self._trie, json_body, values, missing_keys)
+        if missing_keys:
+            drift = self._trie is not None
+            for key in missing_keys:
+                path = findKeyPath(json_body, key)
+                if path is None:
+                    raise KeyError('Key {} not found in JSON'.format(key))
+                with self._lock:
+                    self._key_paths[key] = path
+                if drift:
+                    self.drift_count += 1
+                    if called_from_logger is not None:
+                        called_from_logger.warning('JSON schema drift, key {} moved to path {}'.format(key, path))
+                values[key] = self._resolvePath(json_body, path)
+            with self._lock:
+                self._compileTrie()
+        return values
+
+    @staticmethod
+    def _resolvePath(json_body, path):
+        for step in path:
+            json_body = json_body[step]
+        return json_body
@@ -0,0 +1,116 @@
+import collections
+import concurrent.futures
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+class RetryRequest(Exception):
+    """Raised by a scheduled request_fn to be run again after delay seconds without holding a worker meanwhile"""
+
+    def __init__(self, delay):
+        super().__init__('Retry in {:.2f}s'.format(delay))
+        self.delay = delay
+
+
+class RequestScheduler:
+    """Run the wire requests of every tournament on one shared worker pool. Requests queue per host and at most
+    the host's limit are in flight at once, tournaments take turns within a host so one large tournament can't
+    starve the rest, each result goes back through the future handed to the tournament that submitted it.
+    A request that has to wait, for a rate limit or a backoff, raises RetryRequest and is requeued on a timer"""
+
+    def __init__(self, called_from_logger, max_workers=16, host_limits=None, default_host_limit=4):
+        """Initialize shared pool of max_workers threads, host_limits is a dict of host to max requests in flight"""
+        self._logger = called_from_logger
+        self._max_workers = max_workers
+        self._host_limits = host_limits if host_limits is not None else {}
+        self._default_host_limit = default_host_limit
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        self._lock = threading.Lock()
+        # host -> OrderedDict of owner -> deque of (future, request_fn, url_string), owners are served round robin
+        self._pending = {}
+        self._in_flight = collections.Counter()
+        self.submitted = 0
+        self.completed = 0
+
+    def __repr__(self):
+        return self.__class__.__name__ + ' {} workers: {} requests submitted, {} completed'.format(
+            self._max_workers, self.submitted, self.completed)
+
+    @staticmethod
+    def getHost(url_string):
+        return urlsplit(url_string).netloc
+
+    def _getHostLimit(self, host):
+        return self._host_limits.get(host, self._default_host_limit)
+
+    def submitRequest(self, request_fn, url_string, owner=None):
+        """Queue request_fn(url_string) behind the host limit, return a future with its result"""
+        future = concurrent.futures.Future()
+        host = self.getHost(url_string)
+        with self._lock:
+            owner_queues = self._pending.setdefault(host, collections.OrderedDict())
+            owner_queues.setdefault(owner, collections.deque()).append((future, request_fn, url_string))
+            self.submitted += 1
+        self._dispatchHost(host)
+        return future
+
+    def _dispatchHost(self, host):
+        """Start queued requests for host until its limit is reached"""
+        with self._lock:
+            owner_queues = self._pending.get(host)
+            while owner_queues and self._in_flight[host] < self._getHostLimit(host):
+                owner, owner_queue = owner_queues.popitem(last=False)
+                task = owner_queue.popleft()
+                # owner goes to the back of the line if it still has requests waiting
+                if owner_queue:
+                    owner_queues[owner] = owner_queue
+                self._in_flight[host] += 1
+                self._executor.submit(self._runRequest, host, owner, *task)
+
+    def _runRequest(self, host, owner, future, request_fn, url_string):
+        retry_delay = None
+        try:
+            # a requeued request's future is already running
+            if future.running() or future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(request_fn(url_string))
+                except RetryRequest as retry:
+                    retry_delay = retry.delay
+                except Exception as e:
+                    self._logger.error('Scheduled request {} failed\n{}'.format(url_string, e))
+                    future.set_exception(e)
+        finally:
+            with self._lock:
+                self._in_flight[host] -= 1
+                if retry_delay is None:
+                    self.completed += 1
+            if retry_delay is not None:
+                timer = threading.Timer(retry_delay, self._requeueRequest,
+                                        (host, owner, (future, request_fn, url_string)))
+                timer.daemon = True
+                timer.start()
+            self._dispatchHost(host)
+
+    def _requeueRequest(self, host, owner, task):
+        """Put a delayed request back at the front of its owner's queue, its owner is served next"""
+        with self._lock:
+            owner_queues = self._pending.setdefault(host, collections.OrderedDict())
+            owner_queues.setdefault(owner, collections.deque()).appendleft(task)
+            owner_queues.move_to_end(owner, last=False)
+        self._dispatchHost(host)
+
+    def getQueueStats(self):
+        """Return dict of host to (requests waiting, requests in flight)"""
+        with self._lock:
+            return {host: (sum(len(owner_queue) for owner_queue in owner_queues.values()), self._in_flight[host])
+                    for host, owner_queues in self._pending.items()}
+
+    def closeScheduler(self):
+        """Wait for every queued and delayed request and stop the workers"""
+        while True:
+            with self._lock:
+                if self.completed >= self.submitted:
+                    break
+            time.sleep(.1)
+        self._executor.shutdown(wait=True)
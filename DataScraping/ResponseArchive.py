@@ -0,0 +1,165 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+
+from DataScraping.ResponseCache import ResponseCache
+from DataScraping.TournamentRecording import TournamentRecording
+
+
+class ResponseArchive:
+    """Append only archive of every raw wire response of a tournament for long term retention and reprocessing.
+    Each record is one NDJSON line compressed as its own gzip member, so the whole file streams with gzip.open and
+    a single record is read by seeking to its offset. The index is an NDJSON sidecar of record offsets appended
+    after every record, the last record of a url wins and an unchanged response isn't archived twice.
+    Records the same things as a TournamentRecording"""
+
+    archive_file = 'responses.ndjson.gz'
+    index_file = 'responses.index.ndjson'
+
+    def __init__(self, archive_dir):
+        """Initialize archive in archive_dir, an existing archive is appended to"""
+        self._archive_dir = archive_dir
+        self._archive_path = os.path.join(archive_dir, self.archive_file)
+        self._index_path = os.path.join(archive_dir, self.index_file)
+        self._lock = threading.Lock()
+        self._archive_f = None
+        self._index_f = None
+        self._index = self._loadIndex()
+        # end of the last record the index knows about, anything after it is the tail of a crashed write
+        if os.path.exists(self._index_path):
+            self._archive_end = max((offset + length for offset, length, _ in self._index.values()), default=0)
+        else:
+            # without an index there is nothing to tell a crashed tail apart, leave the archive as it is
+            self._archive_end = os.path.getsize(self._archive_path) if os.path.exists(self._archive_path) else 0
+        self.records_written = 0
+
+    def __repr__(self):
+        return self.__class__.__name__ + ' {}: {} records indexed, {} written'.format(
+            self._archive_path, len(self._index), self.records_written)
+
+    def _loadIndex(self):
+        """Return dict of (record type, key) to (offset, length, value hash), entries past the end of a truncated
+        archive are dropped"""
+        index = {}
+        if not os.path.exists(self._index_path) or not os.path.exists(self._archive_path):
+            return index
+        archive_size = os.path.getsize(self._archive_path)
+        with open(self._index_path, 'r') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # partially written last line from a crash
+                    break
+                if entry['offset'] + entry['length'] <= archive_size:
+                    index[(entry['type'], entry['key'])] = (entry['offset'], entry['length'], entry['hash'])
+        return index
+
+    def _appendRecord(self, record_type, key, value):
+        value_hash = hashlib.sha1(json.dumps(value, sort_keys=True).encode('utf-8')).hexdigest()
+        location = self._index.get((record_type, key))
+        if location is not None and location[2] == value_hash:
+            return
+        record = {'type': record_type, 'key': key, 'archivedAt': time.time(), 'value': value}
+        member = gzip.compress((json.dumps(record) + '\n').encode('utf-8'))
+        with self._lock:
+            if self._archive_f is None:
+                self._openForAppend()
+            self._archive_f.seek(0, os.SEEK_END)
+            offset = self._archive_f.tell()
+            self._archive_f.write(member)
+            self._archive_f.flush()
+            self._index_f.write(json.dumps({'type': record_type, 'key': key, 'offset': offset,
+                                            'length': len(member), 'hash': value_hash}) + '\n')
+            self._index_f.flush()
+            self._index[(record_type, key)] = (offset, len(member), value_hash)
+            self.records_written += 1
+
+    def _openForAppend(self):
+        """Open archive and index for appending, a half written record or index line left by a crash is cut off
+        first so new records never follow garbage"""
+        os.makedirs(self._archive_dir, exist_ok=True)
+        self._archive_f = open(self._archive_path, 'ab')
+        self._archive_f.truncate(self._archive_end)
+        index_lines = []
+        if os.path.exists(self._index_path):
+            with open(self._index_path, 'r') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break
+                    if entry['offset'] + entry['length'] > self._archive_end:
+                        break
+                    index_lines.append(line if line.endswith('\n') else line + '\n')
+        with open(self._index_path + '.tmp', 'w') as f:
+            f.writelines(index_lines)
+        os.replace(self._index_path + '.tmp', self._index_path)
+        self._index_f = open(self._index_path, 'a')
+
+    def recordMetaContent(self, meta_name, content):
+        self._appendRecord('metaContent', meta_name, content)
+
+    def recordPageText(self, xpath, text):
+        self._appendRecord('pageText', xpath, text)
+
+    def recordResponse(self, url_string, json_body):
+        if json_body:
+            self._appendRecord('response', url_string, json_body)
+
+    def getURLs(self):
+        return [key for record_type, key in self._index.keys() if record_type == 'response']
+
+    def getResponse(self, url_string):
+        """Return the archived json object of url by seeking to its record, None if it was never archived"""
+        location = self._index.get(('response', url_string))
+        if location is None:
+            return None
+        with open(self._archive_path, 'rb') as f:
+            f.seek(location[0])
+            member = f.read(location[1])
+        return json.loads(gzip.decompress(member))['value']
+
+    def iterRecords(self, record_type=None):
+        """Stream every record in archive order without loading the archive, stops at a truncated last record"""
+        if not os.path.exists(self._archive_path):
+            return
+        with gzip.open(self._archive_path, 'rt', encoding='utf-8') as f:
+            while True:
+                try:
+                    line = f.readline()
+                    if not line:
+                        break
+                    record = json.loads(line)
+                except (EOFError, ValueError, zlib.error, OSError):
+                    # truncated or corrupt tail of a crashed write
+                    break
+                if record_type is None or record['type'] == record_type:
+                    yield record
+
+    def iterResponses(self, endpoint=None):
+        """Stream (url, json object) of archived responses, optionally only one endpoint type"""
+        for record in self.iterRecords('response'):
+            if endpoint is None or ResponseCache.getEndpointType(record['key']) == endpoint:
+                yield record['key'], record['value']
+
+    def toRecording(self):
+        """Build a TournamentRecording for replaying the archived scrape, later records of a key win"""
+        recording = TournamentRecording()
+        record_dicts = {'metaContent': recording.meta_content, 'pageText': recording.page_text,
+                        'response': recording.responses}
+        for record in self.iterRecords():
+            record_dicts[record['type']][record['key']] = record['value']
+        return recording
+
+    def closeArchive(self):
+        with self._lock:
+            if self._archive_f is not None:
+                self._archive_f.close()
+                self._index_f.close()
+                self._archive_f = None
+                self._index_f = None
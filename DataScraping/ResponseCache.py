@@ -0,0 +1,134 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+
+class ResponseCache:
+    """Persistent on disk cache of wire JSON responses, keyed by a hash of the request url and gzip compressed.
+    Responses of completed tournaments never expire, live responses expire after a per endpoint TTL"""
+
+    # seconds a response is valid while the tournament is still live
+    live_ttl_dict = {
+        'tournament_detail': 60,
+        'course_general': 24 * 60 * 60,
+        'course_detail': 60 * 60,
+        'round_detail': 2 * 60
+    }
+    endpoint_patterns = [
+        ('tournament_detail', re.compile(r'/leaderboard\.json')),
+        ('course_general', re.compile(r'/course\.json')),
+        ('course_detail', re.compile(r'/course\d+')),
+        ('round_detail', re.compile(r'/drawer/'))
+    ]
+    # course.json urls have no year and serve the tournament's next edition too, a completed tournament's
+    # response is only kept for good when stored within this many seconds of marking it completed
+    course_completed_window = 120 * 24 * 60 * 60
+
+    @staticmethod
+    def getEndpointType(url_string, default=None):
+        """Match a wire url to its template_wire_html_dict key, default if it matches none"""
+        for endpoint, pattern in ResponseCache.endpoint_patterns:
+            if pattern.search(url_string):
+                return endpoint
+        return default
+
+    def __init__(self, cache_dir='tournaments/cache/', ttl_dict=None):
+        """Initialize cache directory and the set of tournaments already known to be completed"""
+        self._cache_dir = cache_dir
+        self._ttl_dict = dict(self.live_ttl_dict)
+        if ttl_dict is not None:
+            self._ttl_dict.update(ttl_dict)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        os.makedirs(self._cache_dir, exist_ok=True)
+        self._completed_file = self._cache_dir + 'completed.json'
+        self._completed = self._readCompleted()
+
+    def __repr__(self):
+        return 'Response Cache {}: {} hits, {} misses, {} expired'.format(self._cache_dir, self.hits, self.misses,
+                                                                         self.expired)
+
+    def _getPath(self, url_string):
+        key = hashlib.sha256(url_string.encode('utf-8')).hexdigest()
+        return os.path.join(self._cache_dir, key[:2], key + '.json.gz')
+
+    def _readCompleted(self):
+        """Return dict of completed url key to the time it was marked"""
+        if not os.path.exists(self._completed_file):
+            return {}
+        try:
+            with open(self._completed_file, 'r') as f:
+                completed = json.load(f)
+        except ValueError:
+            return {}
+        # older caches stored a list of keys
+        return dict.fromkeys(completed, 0) if isinstance(completed, list) else completed
+
+    def _isCompleted(self, url_string, stored_at):
+        for completed_key, marked_at in self._completed.items():
+            if completed_key in url_string:
+                return not completed_key.endswith('course.json') or \
+                    abs(stored_at - marked_at) < self.course_completed_window
+        return False
+
+    def _isExpired(self, url_string, stored_at):
+        if self._isCompleted(url_string, stored_at):
+            return False
+        ttl = self._ttl_dict.get(self.getEndpointType(url_string))
+        return ttl is not None and time.time() - stored_at > ttl
+
+    def getJSON(self, url_string):
+        """Return cached json object for the url, None if missing or expired"""
+        path = self._getPath(url_string)
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        if entry['url'] != url_string or self._isExpired(url_string, entry['storedAt']):
+            with self._lock:
+                self.expired += 1
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return entry['body']
+
+    def putJSON(self, url_string, json_body):
+        """Store json object for the url, written to a temp file first so readers never see a partial entry"""
+        if not json_body:
+            return
+        path = self._getPath(url_string)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = '{}.{}.tmp'.format(path, threading.get_ident())
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            json.dump({'url': url_string, 'storedAt': time.time(), 'body': json_body}, f)
+        os.replace(tmp_path, path)
+
+    def markCompleted(self, pga_year, tournament_id):
+        """Responses for a completed tournament never change, stop expiring them"""
+        completed_keys = ['/{}/r/{}/'.format(pga_year, tournament_id), '/r/{}/course.json'.format(tournament_id)]
+        with self._lock:
+            if all(completed_key in self._completed for completed_key in completed_keys):
+                return
+            # other scrapers may have marked tournaments since this cache was loaded, merge instead of overwriting
+            completed = self._readCompleted()
+            completed.update(self._completed)
+            for completed_key in completed_keys:
+                completed[completed_key] = time.time()
+            tmp_path = '{}.{}.tmp'.format(self._completed_file, threading.get_ident())
+            with open(tmp_path, 'w') as f:
+                json.dump(completed, f, sort_keys=True)
+            os.replace(tmp_path, self._completed_file)
+            self._completed = completed
+
+    def getStats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'expired': self.expired}
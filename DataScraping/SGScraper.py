@@ -8,22 +8,54 @@ from SeleniumDriver.WebDriver import WebDriver
 from SeleniumDriver.WebDriver import wait_for_text_to_match
 
 
+def sgStatToFloat(sg_stat):
+    """Convert a table cell to float, None for '--' or anything else that isn't a number"""
+    try:
+        return float(sg_stat)
+    except (TypeError, ValueError):
+        return None
+
+
 class SGScraper:
     """Given a tournament and year, this scrapes pgatour.com tournament result
      page to create json files containing data on tournament info and player course_hole by course_hole shots"""
 
-    def __init__(self):
-        """Initialize SG Scraper"""
+    # whole table in one round trip, each row read cell by cell so an empty cell stays '' at its column index,
+    # splitting the row's text would collapse it
+    sg_table_script = """
+        var table = document.getElementsByClassName('table')[0];
+        if (!table) { return []; }
+        return Array.prototype.map.call(table.getElementsByClassName('datarow'), function (row) {
+            return Array.from(row.cells || row.children, function (cell) { return cell.textContent.trim(); });
+        });
+    """
+
+    # table columns of player name, sgPUTT, sgARG, sgAPP, sgOTT, sgT2G and sgTOT
+    sg_table_columns = (1, 3, 4, 5, 6, 7, 8)
+
+    tournament_options_script = """
+        return Array.prototype.map.call(document.getElementById('dropdown').options, function (option) {
+            return option.text;
+        });
+    """
+
+    def __init__(self, shard_name=None):
+        """Initialize SG Scraper, shard_name gives each parallel scraper its own logger and log file"""
         self._sg_url = 'https://datagolf.com/historic-event-data'
+        self._shard_name = shard_name
 
         # create place holder dictionaries for data once scraped
         self._tournament_sg_col = []
 
         # all I/O done in tournaments/'pga_year'_'tournament_name' directory
-        self._file_handler = 'tournaments/SG/logs/sg_scape.log'
+        if shard_name is None:
+            self._file_handler = 'tournaments/SG/logs/sg_scape.log'
+        else:
+            self._file_handler = 'tournaments/SG/logs/sg_scape_{}.log'.format(shard_name)
 
         # initialize logger
-        self._logger = MyLogger(self.__class__.__name__, self._file_handler, logging.INFO, 'w').getLogger()
+        logger_name = self.__class__.__name__ if shard_name is None else self.__class__.__name__ + ' ' + shard_name
+        self._logger = MyLogger(logger_name, self._file_handler, logging.INFO, 'w').getLogger()
 
         # initialize driver
         self.web_driver = WebDriver(self._logger)
@@ -31,35 +63,74 @@ class SGScraper:
 
     def __repr__(self):
         """Print Scraper Class with scraped status"""
-        return self.__class__.__name__
+        name = self.__class__.__name__ if self._shard_name is None else self.__class__.__name__ + ' ' + \
+            self._shard_name
+        return name + ': {} SG records'.format(len(self._tournament_sg_col))
 
     def _sgStatsToDict(self, year_name, tournament_name, sg_stats):
-        self._logger.info('Getting SG stats for {} during {} {}'.format(sg_stats[0], year_name, tournament_name))
+        """Add a record of player name and numeric SG stats"""
         self._tournament_sg_col.append({
             'pgaYear': year_name,
             'tournamentName': tournament_name,
             'playerName': sg_stats[0],
-            'sgPUTT': sg_stats[1],
-            'sgARG': sg_stats[2],
-            'sgAPP': sg_stats[3],
-            'sgOTT': sg_stats[4],
-            'sgT2G': sg_stats[5],
-            'sgTOT': sg_stats[6]
+            'sgPUTT': sgStatToFloat(sg_stats[1]),
+            'sgARG': sgStatToFloat(sg_stats[2]),
+            'sgAPP': sgStatToFloat(sg_stats[3]),
+            'sgOTT': sgStatToFloat(sg_stats[4]),
+            'sgT2G': sgStatToFloat(sg_stats[5]),
+            'sgTOT': sgStatToFloat(sg_stats[6])
         })
 
-    def runScrape(self, years_to_scrape):
-        """"""
-        self._logger.info(
-            'Go to SG Scrape url {}\n'.format(self._sg_url))
+    def _scrapeSGTable(self, year_name, tournament_name):
+        """Read the whole SG table with one script call instead of a round trip per row, return rows added"""
+        data_rows = self.web_driver.executeScript(self.sg_table_script, 'Error reading SG table\n{}')
+        if data_rows is None:
+            return 0
+        num_rows = 0
+        for sg_stats in data_rows:
+            if len(sg_stats) <= max(self.sg_table_columns) or sg_stats[3] == '--':
+                self._logger.info('No SG stats for {} {}'.format(year_name, tournament_name))
+                break
+            if sg_stats[1] == '':
+                continue
+            # empty stat cells become None in sgStatToFloat
+            self._sgStatsToDict(year_name, tournament_name, [sg_stats[i] for i in self.sg_table_columns])
+            num_rows += 1
+        return num_rows
+
+    def getTournamentOptions(self):
+        """Go to the SG page and return every tournament name in the dropdown, None on failure"""
+        self._logger.info('Go to SG Scrape url {}\n'.format(self._sg_url))
         self.web_driver.goToURL(self._sg_url)
+        return self.web_driver.executeScript(self.tournament_options_script,
+                                             'Error reading tournament dropdown\n{}')
+
+    @staticmethod
+    def isWanted(tournament_name, year_name, years_to_scrape=None, tournament_names=None, tournament_years=None):
+        """A tournament year is scraped if it's in the shard's tournament names and either its year is in
+        years_to_scrape or the (tournament name, year) pair is in tournament_years"""
+        if tournament_names is not None and tournament_name not in tournament_names:
+            return False
+        if year_name is None:
+            return (years_to_scrape is not None or tournament_years is None or
+                    any(pair[0] == tournament_name for pair in tournament_years))
+        return ((years_to_scrape is not None and year_name in years_to_scrape) or
+                (tournament_years is not None and (tournament_name, year_name) in tournament_years))
+
+    def runScrape(self, years_to_scrape=None, tournament_names=None, tournament_years=None):
+        """Scrape the SG table of every wanted tournament year, optionally only the dropdown options in
+        tournament_names and the (tournament name, year) pairs in tournament_years"""
+        options = self.getTournamentOptions()
+        if options is None:
+            return False
         driver = self.web_driver.getDriver()
 
         try:
             tournament_selector = Select(driver.find_element_by_id('dropdown'))
-            num_options = len(tournament_selector.options)
-            for idx in range(num_options):
-                tournament_selector.select_by_index(idx)
-                tournament_name = tournament_selector.first_selected_option.text
+            for tournament_name in options:
+                if not self.isWanted(tournament_name, None, years_to_scrape, tournament_names, tournament_years):
+                    continue
+                tournament_selector.select_by_visible_text(tournament_name)
                 _ = self.web_driver.webDriverWait(driver,
                                                   wait_for_text_to_match(
                                                       (By.CLASS_NAME, 'subtitle'),
@@ -68,19 +139,15 @@ class SGScraper:
                 self.year_options = driver.find_elements_by_class_name('yearoptions')
                 for year in reversed(self.year_options):
                     year_name = year.text
-                    if year_name not in years_to_scrape:
+                    if not self.isWanted(tournament_name, year_name, years_to_scrape, tournament_names,
+                                         tournament_years):
                         continue
 
                     self._logger.info('\nRunning SG Scrape for {} {}'.format(year_name, tournament_name))
                     year.click()
-                    sg_table = driver.find_element_by_class_name('table')
-                    data_rows = sg_table.find_elements_by_class_name('datarow')
-                    for row in data_rows:
-                        sg_stats = row.text.split('\n')
-                        if sg_stats[3] == '--':
-                            self._logger.info('No SG stats for {} {}'.format(year_name, tournament_name))
-                            break
-                        self._sgStatsToDict(year_name, tournament_name, [sg_stats[i] for i in (1, 3, 4, 5, 6, 7, 8)])
+                    num_rows = self._scrapeSGTable(year_name, tournament_name)
+                    self._logger.info('Got SG stats for {} players during {} {}'.format(num_rows, year_name,
+                                                                                         tournament_name))
             return True
         except Exception as e:
             self._logger.error('Failed running SG scrape due to {}'.format(e), exc_info=True)
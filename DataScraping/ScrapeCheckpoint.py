@@ -0,0 +1,72 @@
+import json
+import os
+import threading
+import time
+
+
+class ScrapeCheckpoint:
+    """Append only NDJSON journal of a tournament scrape. Every completed player round is appended as it is parsed
+    and the remaining scrape state is appended whenever it changes, a crash loses at most the line being written"""
+
+    # bump when the state saved by TournamentScraper changes, journals of another version are discarded
+    journal_version = 2
+
+    def __init__(self, checkpoint_path):
+        """Initialize journal at checkpoint_path, nothing is written until the first save"""
+        self._checkpoint_path = checkpoint_path
+        self._lock = threading.Lock()
+        self.player_rounds_saved = 0
+
+    def __repr__(self):
+        return self.__class__.__name__ + ' {}: {} player rounds saved'.format(self._checkpoint_path,
+                                                                            self.player_rounds_saved)
+
+    def _appendLine(self, line_dict):
+        with self._lock:
+            with open(self._checkpoint_path, 'a') as f:
+                f.write(json.dumps(line_dict) + '\n')
+                f.flush()
+
+    def saveState(self, state_dict):
+        """Append scrape state, the last state in the journal wins on load"""
+        self._appendLine({'type': 'state', 'version': self.journal_version, 'savedAt': time.time(),
+                          'state': state_dict})
+
+    def savePlayerRound(self, player_id, round_num, round_dict):
+        self._appendLine({'type': 'playerRound', 'playerID': player_id, 'roundNum': round_num, 'round': round_dict})
+        self.player_rounds_saved += 1
+
+    def loadCheckpoint(self):
+        """Return (last state dict, player round dict, time the state was saved) from the journal, None if there is
+        no checkpoint or it was written by another journal version"""
+        if not os.path.exists(self._checkpoint_path):
+            return None
+        state_dict = {}
+        version = None
+        saved_at = 0.0
+        player_round_dict = {}
+        with open(self._checkpoint_path, 'r') as f:
+            for line in f:
+                try:
+                    line_dict = json.loads(line)
+                except ValueError:
+                    # partially written last line from a crash
+                    break
+                if line_dict['type'] == 'state':
+                    state_dict = line_dict['state']
+                    version = line_dict.get('version')
+                    saved_at = line_dict.get('savedAt', 0.0)
+                elif line_dict['type'] == 'playerRound':
+                    player_round_dict.setdefault(line_dict['playerID'], {})[line_dict['roundNum']] = \
+                        line_dict['round']
+        if version != self.journal_version:
+            return None
+        return state_dict, player_round_dict, saved_at
+
+    def exists(self):
+        return os.path.exists(self._checkpoint_path)
+
+    def clearCheckpoint(self):
+        with self._lock:
+            if os.path.exists(self._checkpoint_path):
+                os.remove(self._checkpoint_path)
@@ -0,0 +1,43 @@
+import gzip
+import json
+
+
+class TournamentRecording:
+    """Raw wire responses and page text captured during a live scrape so the scrape can be replayed offline"""
+
+    @staticmethod
+    def loadRecording(recording_path):
+        """Load a recording saved by saveRecording"""
+        with gzip.open(recording_path, 'rt', encoding='utf-8') as f:
+            recording_dict = json.load(f)
+        recording = TournamentRecording()
+        recording.meta_content = recording_dict['metaContent']
+        recording.page_text = recording_dict['pageText']
+        recording.responses = recording_dict['responses']
+        return recording
+
+    def __init__(self):
+        """Initialize empty recording of meta tag content, xpath text and wire url to json object"""
+        self.meta_content = {}
+        self.page_text = {}
+        self.responses = {}
+
+    def __repr__(self):
+        return self.__class__.__name__ + ' with {} responses'.format(len(self.responses))
+
+    def recordMetaContent(self, meta_name, content):
+        self.meta_content[meta_name] = content
+
+    def recordPageText(self, xpath, text):
+        self.page_text[xpath] = text
+
+    def recordResponse(self, url_string, json_body):
+        if json_body:
+            self.responses[url_string] = json_body
+
+    def saveRecording(self, recording_path):
+        """Save recording as gzip compressed json"""
+        with gzip.open(recording_path, 'wt', encoding='utf-8') as f:
+            json.dump({'metaContent': self.meta_content,
+                       'pageText': self.page_text,
+                       'responses': self.responses}, f)
@@ -1,16 +1,27 @@
 import json
 import logging
 import re
+import time
 
 from nested_lookup import nested_lookup
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 
+from DataScraping.DrawerPlanner import DrawerPlanner
+from DataScraping.JSONExtractor import JSONExtractor
+from DataScraping.ResponseArchive import ResponseArchive
+from DataScraping.ResponseCache import ResponseCache
+from DataScraping.ScrapeCheckpoint import ScrapeCheckpoint
+from DataScraping.TournamentRecording import TournamentRecording
+from DataScraping.WireFetcher import urlIsBuilt
 from Logging.MyLogger import MyLogger
+from Logging.ScrapeMetrics import ScrapeMetrics
+from SeleniumDriver.ReplayDriver import ReplayDriver
 from SeleniumDriver.WebDriver import WebDriver
 
 
 def findKeyInJSON(json_body, key):
+    """Full search of the JSON for the first value under key, JSONExtractor resolves compiled paths instead"""
     return nested_lookup(key, json_body)[0]
 
 
@@ -18,8 +29,50 @@ class TournamentScraper:
     """Given a tournament and year, this scrapes pgatour.com tournament result
      page to create json files containing data on tournament info and player course_hole by course_hole shots"""
 
-    def __init__(self, pga_tournament, pga_year, driver=None):
-        """Initialize scraper with tournament, year, optional logger name, wire requests dict, web driver"""
+    # field paths of each wire endpoint are compiled once and shared by every scraper
+    json_extractors = {
+        'tournament_detail': JSONExtractor(['year', 'cutLines', 'multiCourse', 'totalRounds', 'format', 'roundState',
+                                            'playoffPresent', 'rows']),
+        'course_general': JSONExtractor(['number', 'body', 'name', 'yards']),
+        'course_detail': JSONExtractor(['courseId', 'holes', 'courseCode', 'parIn', 'parOut', 'parTotal']),
+        'round_detail': JSONExtractor(['courseId', 'playersHoles', 'roundComplete', 'groupId', 'startingHoleId'])
+    }
+
+    # seconds a checkpoint of a tournament that wasn't official yet can be resumed, after that its player rounds
+    # may have changed, the same as a cached drawer
+    live_checkpoint_max_age = ResponseCache.live_ttl_dict['round_detail']
+
+    # text read off the leaderboard page, everything else comes from the wire JSON
+    page_xpath_dict = {
+        'dates': './/span[@class = "dates"]',
+        'location': './/span[@class = "name"]'
+    }
+
+    @classmethod
+    def fromRecording(cls, pga_tournament, pga_year, recording_path=None):
+        """Create a scraper that replays a recorded scrape, no browser and no network,
+        defaults to the recording saved in the tournament directory"""
+        if recording_path is None:
+            recording_path = 'tournaments/' + pga_year + '_' + pga_tournament + '/recording.json.gz'
+        replay_driver = ReplayDriver(TournamentRecording.loadRecording(recording_path))
+        return cls(pga_tournament, pga_year, replay_driver, replay_driver, checkpoint=False)
+
+    @classmethod
+    def fromArchive(cls, pga_tournament, pga_year, archive_dir=None):
+        """Create a scraper that reprocesses the raw responses of a ResponseArchive, no browser and no network,
+        defaults to the archive in the tournament directory"""
+        if archive_dir is None:
+            archive_dir = 'tournaments/' + pga_year + '_' + pga_tournament + '/archive/'
+        replay_driver = ReplayDriver(ResponseArchive(archive_dir).toRecording())
+        return cls(pga_tournament, pga_year, replay_driver, replay_driver, checkpoint=False)
+
+    def __init__(self, pga_tournament, pga_year, driver=None, fetcher=None, response_cache=None, record=False,
+                 checkpoint=True, archive=False):
+        """Initialize scraper with tournament, year, optional logger name, wire requests dict, web driver,
+        optional wire fetcher to request the JSON directly instead of through the browser,
+        optional response cache shared by the driver and fetcher, record saves raw responses for replay,
+        checkpoint journals progress and resumes from an earlier unfinished scrape,
+        archive appends every raw response to the tournament's compressed ResponseArchive"""
         self._pga_tournament = pga_tournament
         self._pga_year = pga_year
         self._tournament_url = 'https://www.pgatour.com/competition/' + pga_year + '/' + pga_tournament + \
@@ -37,6 +90,13 @@ class TournamentScraper:
         self._unsuccessful_player_round_scrape = {}
         self._course_requests = {}
         self._row_dict = {}
+        self._player_rounds_played = {}
+        self._round_signatures = {}
+        self._prefetched_json = {}
+        self._page_text = {}
+        self.recording = TournamentRecording() if record else None
+        self.upload_pipeline = None
+        self.metrics = ScrapeMetrics({'tournament': pga_tournament, 'year': pga_year})
 
         # use this default dictionary as template for wire requests
         self.template_wire_html_dict = {
@@ -54,28 +114,102 @@ class TournamentScraper:
         self._logger = MyLogger(self.__class__.__name__ + ' ' + self._pga_year + ' ' + self._pga_tournament,
                                 self._file_handler, logging.INFO, 'a').getLogger()
 
+        # raw responses and page text go to the recording for replay and the archive for retention
+        self.archive = ResponseArchive(self.dir + 'archive/') if archive else None
+        self._recorders = [recorder for recorder in (self.recording, self.archive) if recorder is not None]
+
+        # resume from the checkpoint of an earlier failed or crashed scrape
+        self._checkpoint = ScrapeCheckpoint(self.dir + 'checkpoint.ndjson') if checkpoint else None
+        if self._checkpoint is not None:
+            self._restoreCheckpoint()
+
+        # initialize response cache so retries and re-scrapes don't download the same JSON again
+        if response_cache is None:
+            self.response_cache = ResponseCache()
+        else:
+            self.response_cache = response_cache
+
         # initialize driver
         if driver is None:
             self.web_driver = WebDriver(self._logger)
         else:
             self.web_driver = driver
         self.web_driver.updateLogLocations(' ' + self._pga_year + ' ' + self._pga_tournament, self._file_handler)
+        self.web_driver.setResponseCache(self.response_cache)
+        self.web_driver.setMetrics(self.metrics)
+
+        # initialize direct fetcher, selenium wire is only used when no fetcher exists or a url can't be built
+        self.wire_fetcher = fetcher
+        if self.wire_fetcher is not None:
+            self.wire_fetcher.updateLogger(self._logger)
+            self.wire_fetcher.setResponseCache(self.response_cache)
+            self.wire_fetcher.setMetrics(self.metrics)
 
     def __repr__(self):
         """Print Scraper Class with year, tournament and scraped status"""
         return (self.__class__.__name__ + ' ' + self._pga_year + ' ' + self._pga_tournament
                 + '\nScrape Status: Scraped {:.2f}% of potential data'.format(self.successfully_scraped))
 
+    def _restoreCheckpoint(self):
+        """Restore dictionaries from the checkpoint journal if one exists"""
+        checkpoint = self._checkpoint.loadCheckpoint()
+        if checkpoint is None:
+            if self._checkpoint.exists():
+                self._logger.info('Discarding checkpoint written by another journal version')
+                self._checkpoint.clearCheckpoint()
+            return
+        state_dict, player_round_dict, saved_at = checkpoint
+        checkpoint_age = time.time() - saved_at
+        if state_dict.get('tournamentInfo', {}).get('status') != 'Official' and \
+                checkpoint_age > self.live_checkpoint_max_age:
+            # e.g. an aborted live event, the leaderboard has moved on since
+            self._logger.info('Discarding checkpoint of a tournament in progress saved {:.0f}s ago'.format(
+                checkpoint_age))
+            self._checkpoint.clearCheckpoint()
+            return
+        self._player_round_dict = player_round_dict
+        self.tournament_id = state_dict.get('tournamentID')
+        self._tournament_info_dict = state_dict.get('tournamentInfo', {})
+        self._player_meta_dict = state_dict.get('playerMeta', {})
+        self._player_rounds_played = state_dict.get('playerRoundsPlayed', {})
+        self._course_ids = set(state_dict.get('courseIDs', []))
+        self._course_requests = state_dict.get('courseRequests', {})
+        self._course_general_dict = state_dict.get('courseGeneral', {})
+        self._course_meta_dict = state_dict.get('courseMeta', {})
+        self._row_dict = {int(row_num): player_requests
+                          for row_num, player_requests in state_dict.get('pendingRows', {}).items()}
+        self._unsuccessful_player_round_scrape = state_dict.get('unsuccessfulPlayerRounds', {})
+        self._logger.info('Resumed from checkpoint with {} player rounds and {} pending rows'.format(
+            sum(len(rounds) for rounds in self._player_round_dict.values()), len(self._row_dict)))
+
+    def _saveCheckpointState(self):
+        """Append everything but the player rounds, those are journaled as they're parsed"""
+        if self._checkpoint is None:
+            return
+        self._checkpoint.saveState({
+            'tournamentID': self.tournament_id,
+            'tournamentInfo': self._tournament_info_dict,
+            'playerMeta': self._player_meta_dict,
+            'playerRoundsPlayed': self._player_rounds_played,
+            'courseIDs': sorted(self._course_ids),
+            'courseRequests': self._course_requests,
+            'courseGeneral': self._course_general_dict,
+            'courseMeta': self._course_meta_dict,
+            'pendingRows': self._row_dict,
+            'unsuccessfulPlayerRounds': self._unsuccessful_player_round_scrape
+        })
+
     def _scrapeTournamentJSON(self, tournament_detail_json):
         """Insert into dictionaries from the detailed tournament info JSON"""
+        tournament_fields = self.json_extractors['tournament_detail'].extract(tournament_detail_json, self._logger)
 
         # make sure pga years match
-        if self._pga_year != findKeyInJSON(tournament_detail_json, 'year'):
+        if self._pga_year != tournament_fields['year']:
             self._logger.warning('Error: Non-matching PGA years. User Input {}; JSON {}'
-                                 .format(self._pga_year, findKeyInJSON(tournament_detail_json, 'year')))
+                                 .format(self._pga_year, tournament_fields['year']))
 
         # cut line data
-        cut_line_info = findKeyInJSON(tournament_detail_json, 'cutLines')
+        cut_line_info = tournament_fields['cutLines']
         cut_dict = {'cuts': []}
         for i, cut in enumerate(cut_line_info, start=1):
             cut_dict['cuts'].append({
@@ -90,45 +224,74 @@ class TournamentScraper:
         self._tournament_info_dict.update({
             'tournamentID': self.tournament_id,
             'tournamentName': self._pga_tournament,
-            'multiCourse': findKeyInJSON(tournament_detail_json, 'multiCourse'),
-            'totalRounds': findKeyInJSON(tournament_detail_json, 'totalRounds'),
-            'format': findKeyInJSON(tournament_detail_json, 'format'),
-            'pgaYear': findKeyInJSON(tournament_detail_json, 'year'),
-            'status': findKeyInJSON(tournament_detail_json, 'roundState'),
-            'playoff': findKeyInJSON(tournament_detail_json, 'playoffPresent'),
-            'dates': self.web_driver.findElementByXPath('.//span[@class = "dates"]'),
-            'location': self.web_driver.findElementByXPath('.//span[@class = "name"]')
+            'multiCourse': tournament_fields['multiCourse'],
+            'totalRounds': tournament_fields['totalRounds'],
+            'format': tournament_fields['format'],
+            'pgaYear': tournament_fields['year'],
+            'status': tournament_fields['roundState'],
+            'playoff': tournament_fields['playoffPresent'],
+            'dates': self._findPageText(self.page_xpath_dict['dates']),
+            'location': self._findPageText(self.page_xpath_dict['location'])
         })
 
+        # official results won't change, cached responses for this tournament can be kept indefinitely
+        if self._tournament_info_dict['status'] == 'Official':
+            self.response_cache.markCompleted(self._pga_year, self.tournament_id)
+
         # create player name dictionary
-        player_rows = findKeyInJSON(tournament_detail_json, 'rows')
+        player_rows = tournament_fields['rows']
         for row in player_rows:
             self._player_meta_dict[row['playerId']] = {}
             self._player_meta_dict[row['playerId']]['firstName'] = row['playerNames']['firstName']
             self._player_meta_dict[row['playerId']]['lastName'] = row['playerNames']['lastName']
+            self._player_rounds_played[row['playerId']] = self._getRoundsPlayed(row)
+            self._round_signatures[row['playerId']] = self._getRoundSignatures(row)
+
+    def _getRoundsPlayed(self, row):
+        """Round numbers a leaderboard row has started, falls back to every round of the tournament"""
+        rounds_played = [str(round_info['roundNumber']) for round_info in row.get('rounds', [])
+                         if round_info.get('strokes') not in (None, '', '--')]
+        if len(rounds_played) == 0:
+            rounds_played = [str(round_num) for round_num in
+                             range(1, int(self._tournament_info_dict.get('totalRounds') or 4) + 1)]
+        return rounds_played
+
+    def _getRoundSignatures(self, row):
+        """Round number to the leaderboard values that change while a round is played,
+        a live poll only re-requests a drawer when its round signature changes"""
+        round_signatures = {}
+        for round_info in row.get('rounds', []):
+            round_signatures[str(round_info['roundNumber'])] = [round_info.get('strokes')]
+        current_round = row.get('currentRound')
+        if current_round is not None:
+            round_signatures.setdefault(str(current_round), []).extend([row.get('thru'), row.get('roundComplete')])
+        return round_signatures
 
     def _scrapeCourseGeneral(self, course_general_json):
         """Insert into dictionaries from the general course information JSON"""
 
         for course_desc in course_general_json['courses']:
-            course_id = findKeyInJSON(course_desc, 'number')
-            self._course_general_dict[course_id] = {
-                'description': findKeyInJSON(course_desc, 'body'),
-                'name': findKeyInJSON(course_desc, 'name'),
-                'totalYards': findKeyInJSON(course_desc, 'yards')
+            course_fields = self.json_extractors['course_general'].extract(course_desc, self._logger)
+            self._course_general_dict[course_fields['number']] = {
+                'description': course_fields['body'],
+                'name': course_fields['name'],
+                'totalYards': course_fields['yards']
             }
 
-    def _scrapePlayerDetail(self, main_player_id, round_num, round_detail_json):
+    def _scrapePlayerDetail(self, main_player_id, round_num, round_detail_json, overwrite=False):
         """Insert into dictionaries the data from the player round detail JSON"""
 
-        """Scrape data from the player round specific JSON"""
-        if main_player_id in self._player_round_dict and round_num in self._player_round_dict[main_player_id]:
+        """Scrape data from the player round specific JSON, overwrite replaces a round already downloaded,
+        returns the player IDs whose round was filled in"""
+        if not overwrite and main_player_id in self._player_round_dict and \
+                round_num in self._player_round_dict[main_player_id]:
             self._logger.info(
                 'Previously downloaded JSON for round {} from player ID {}'.format(round_num, main_player_id))
-            return
+            return []
 
         self._logger.info('Downloading JSON from round {} for player ID {}'.format(round_num, main_player_id))
-        course_id = findKeyInJSON(round_detail_json, 'courseId')
+        round_fields = self.json_extractors['round_detail'].extract(round_detail_json, self._logger)
+        course_id = round_fields['courseId']
         # only add if course hasn't been added to course ids yet
         if course_id not in self._course_ids:
             # add course to wire requests
@@ -138,7 +301,7 @@ class TournamentScraper:
                 .replace('C_ID', course_id)
             self._course_ids.add(course_id)
 
-        play_by_play = findKeyInJSON(round_detail_json, 'playersHoles')
+        play_by_play = round_fields['playersHoles']
         player_hole_dict = {}
 
         # get shot level data
@@ -163,19 +326,27 @@ class TournamentScraper:
                 self._player_round_dict[player_id][round_num] = {}
             self._player_round_dict[player_id][round_num]['play-by-play'] = player_hole_dict[player_id]
             self._player_round_dict[player_id][round_num]['metadata'] = {
-                'completedRound': findKeyInJSON(round_detail_json, 'roundComplete'),
-                'groupId': findKeyInJSON(round_detail_json, 'groupId'),
-                'startingHoleId': findKeyInJSON(round_detail_json, 'startingHoleId'),
-                'courseId': findKeyInJSON(round_detail_json, 'courseId'),
+                'completedRound': round_fields['roundComplete'],
+                'groupId': round_fields['groupId'],
+                'startingHoleId': round_fields['startingHoleId'],
+                'courseId': round_fields['courseId'],
                 'playedWith': [other_id for other_id in player_hole_dict.keys() if other_id != player_id]
             }
+            if self._checkpoint is not None:
+                self._checkpoint.savePlayerRound(player_id, round_num, self._player_round_dict[player_id][round_num])
+        if self.upload_pipeline is not None:
+            self.upload_pipeline.submitPlayerRounds([
+                self._convertPlayerRound(player_id, round_num, self._player_round_dict[player_id][round_num])
+                for player_id in player_hole_dict.keys()])
         self._unsuccessful_player_round_scrape.pop(' '.join([main_player_id, round_num]), None)
+        return list(player_hole_dict.keys())
 
     def _scrapeCourseDetail(self, c_id, course_detail_json):
         """Insert into dictionaries from the course detail JSON"""
         self._logger.info('Downloading JSON for course {}'.format(c_id))
 
-        course_id = findKeyInJSON(course_detail_json, 'courseId')
+        course_fields = self.json_extractors['course_detail'].extract(course_detail_json, self._logger)
+        course_id = course_fields['courseId']
 
         # check if this is a mismatch from c_id
         if c_id != course_id:
@@ -191,7 +362,7 @@ class TournamentScraper:
         hole_detail_dict = {}
 
         # course_hole by course_hole data
-        for hole in findKeyInJSON(course_detail_json, 'holes'):
+        for hole in course_fields['holes']:
             round_info = {'rounds': []}
             for round_details in hole['rounds']:
                 round_detail = {
@@ -205,36 +376,91 @@ class TournamentScraper:
 
         # add metadata
         self._course_meta_dict[course_id] = {
-            'courseCode': findKeyInJSON(course_detail_json, 'courseCode'),
-            'parIn': findKeyInJSON(course_detail_json, 'parIn'),
-            'parOut': findKeyInJSON(course_detail_json, 'parOut'),
-            'parTotal': findKeyInJSON(course_detail_json, 'parTotal'),
+            'courseCode': course_fields['courseCode'],
+            'parIn': course_fields['parIn'],
+            'parOut': course_fields['parOut'],
+            'parTotal': course_fields['parTotal'],
             'holes': hole_detail_dict
         }
         # add data from course general dict if exists
         if course_id in self._course_general_dict:
             self._course_meta_dict[course_id].update(self._course_general_dict[course_id])
 
+    def _requestJSON(self, req_str, use_cache=True):
+        """Get JSON directly when a fetcher exists and the url is fully built, otherwise wait on the selenium wire"""
+        if req_str in self._prefetched_json:
+            return self._prefetched_json.pop(req_str)
+        if self.wire_fetcher is not None and urlIsBuilt(req_str):
+            json_body = self.wire_fetcher.fetchJSON(req_str, use_cache)
+        elif self.web_driver is None:
+            self._logger.error('Driver detached, can not wait on selenium wire for {}'.format(req_str))
+            json_body = ''
+        else:
+            json_body = self.web_driver.wireRequestToJSON(req_str)
+        for recorder in self._recorders:
+            recorder.recordResponse(req_str, json_body)
+        return json_body
+
+    def _findPageText(self, xpath):
+        """Get text from the page, recorded so replays don't need the page"""
+        if xpath in self._page_text:
+            return self._page_text[xpath]
+        if self.web_driver is None:
+            self._logger.error('Driver detached before reading page text {}'.format(xpath))
+            return ''
+        text = self.web_driver.findElementByXPath(xpath)
+        self._page_text[xpath] = text
+        for recorder in self._recorders:
+            recorder.recordPageText(xpath, text)
+        return text
+
+    def _prefetchPlayerRequests(self, player_requests, use_cache=True, skip_scraped=True):
+        """Fetch player round requests concurrently so the request loop only parses, skip_scraped leaves out
+        player rounds already filled e.g. by a group mate's drawer in an earlier wave"""
+        if self.wire_fetcher is None:
+            return
+        req_strs = [request['Wire'] for request in player_requests
+                    if urlIsBuilt(request['Wire']) and request['Wire'] not in self._prefetched_json and
+                    not (skip_scraped and request['RoundNum'] in self._player_round_dict.get(request['PlayerID'], {}))]
+        prefetched_json = self.wire_fetcher.fetchManyJSON(req_strs, use_cache)
+        for recorder in self._recorders:
+            for req_str, json_body in prefetched_json.items():
+                recorder.recordResponse(req_str, json_body)
+        self._prefetched_json.update(prefetched_json)
+
+    def _clearPrefetched(self):
+        """Drop prefetched drawers no request read, their rounds were filled by a group mate's drawer"""
+        if self._prefetched_json:
+            self._logger.info('Dropping {} prefetched drawers that were not needed'.format(len(self._prefetched_json)))
+            self._prefetched_json.clear()
+
     def _getTournamentJSON(self, req_str):
         """Get tournament details from the JSON request string, rerun scrape if this isn't working"""
-        tournament_detail_json = self.web_driver.wireRequestToJSON(req_str)
+        tournament_detail_json = self._requestJSON(req_str)
         if tournament_detail_json:
-            self._scrapeTournamentJSON(tournament_detail_json)
+            with self.metrics.timeOperation('parse', 'tournament_detail'):
+                self._scrapeTournamentJSON(tournament_detail_json)
             return True
         else:
             return False
 
     def _getCourseGeneralJSON(self, req_str):
         """Get course general details from the JSON request string"""
-        course_general_json = self.web_driver.wireRequestToJSON(req_str)
+        course_general_json = self._requestJSON(req_str)
         if course_general_json:
-            self._scrapeCourseGeneral(course_general_json)
+            with self.metrics.timeOperation('parse', 'course_general'):
+                self._scrapeCourseGeneral(course_general_json)
 
     def _getPlayerLevelJSON(self, req_str, main_player_id, round_num):
         """Get player level details from the JSON request string"""
-        round_detail_json = self.web_driver.wireRequestToJSON(req_str)
+        if main_player_id in self._player_round_dict and round_num in self._player_round_dict[main_player_id]:
+            self._logger.info(
+                'Previously downloaded JSON for round {} from player ID {}'.format(round_num, main_player_id))
+            return True
+        round_detail_json = self._requestJSON(req_str)
         if round_detail_json:
-            self._scrapePlayerDetail(main_player_id, round_num, round_detail_json)
+            with self.metrics.timeOperation('parse', 'round_detail'):
+                self._scrapePlayerDetail(main_player_id, round_num, round_detail_json)
             return True
         else:
             return False
@@ -242,21 +468,24 @@ class TournamentScraper:
     def _getCourseDetailJSON(self):
         """Get course details from the JSON request string"""
         for c_id, req_str in self._course_requests.items():
-            course_detail_json = self.web_driver.wireRequestToJSON(req_str)
+            if c_id in self._course_meta_dict:
+                continue
+            course_detail_json = self._requestJSON(req_str)
             if course_detail_json:
-                self._scrapeCourseDetail(c_id, course_detail_json)
+                with self.metrics.timeOperation('parse', 'course_detail'):
+                    self._scrapeCourseDetail(c_id, course_detail_json)
+        self._saveCheckpointState()
 
     def _getTournamentID(self):
         """Get tournament ID from Xpath"""
-        tournament_xpath = self.web_driver.webDriverWait(self.web_driver.getDriver(),
-                                                         EC.presence_of_element_located(
-                                                             (By.XPATH,
-                                                              "//meta[@name='branch:deeplink:tournament_id']")),
-                                                         'Error getting tournament_id\n{}')
-        if tournament_xpath is None:
-            self._logger.error('Could not get a tournament ID out of {}\n'.format(tournament_xpath))
+        tournament_content = self.web_driver.waitForMetaContent('branch:deeplink:tournament_id',
+                                                                'Error getting tournament_id\n{}')
+        if tournament_content is None:
+            self._logger.error('Could not get a tournament ID out of {}\n'.format(tournament_content))
             return False
-        self.tournament_id = re.findall(r'\d+', tournament_xpath.get_attribute('content'))[0]
+        for recorder in self._recorders:
+            recorder.recordMetaContent('branch:deeplink:tournament_id', tournament_content)
+        self.tournament_id = re.findall(r'\d+', tournament_content)[0]
 
         if not self.tournament_id:
             self._logger.error('Could not get a tournament ID out of string {}\n'.format(self.tournament_id))
@@ -279,7 +508,8 @@ class TournamentScraper:
         if player_name_col_button is None:
             return player_reqs
         _ = player_name_col_button.location_once_scrolled_into_view
-        player_name_col_button.click()
+        with self.metrics.timeOperation('dom_click', 'dom'):
+            player_name_col_button.click()
 
         # get the player drawer that opens
         player_drawer = self.web_driver.webDriverWait(row.parent,
@@ -312,73 +542,64 @@ class TournamentScraper:
                 continue
 
             self._logger.info('Getting JSON wire for round {} from player ID {}'.format(round_num, main_player_id))
-            player_reqs.append(
-                {'PlayerID': main_player_id,
-                 'RoundNum': round_num,
-                 'Wire':
-                     self.template_wire_html_dict['round_detail']
-                         .replace('PGA_YEAR', self._pga_year)
-                         .replace('TOURNAMENT_ID', self.tournament_id)
-                         .replace('ROUND_NUM', round_num)
-                         .replace('MAIN_PLAYER_ID', main_player_id)})
+            player_reqs.append(self._getPlayerRoundRequest(main_player_id, round_num))
 
             if round_num != last_round:
                 self.web_driver.getDriver().implicitly_wait(.1)
-                round_button.click()
+                with self.metrics.timeOperation('dom_click', 'dom'):
+                    round_button.click()
 
         # this closes the player's shot information chart
         # player_name_col_button.click()
         return player_reqs
 
-    def _checkScrapeResults(self):
-        """After getting all JSON and converting to dictionaries, check to see how we did"""
-        if len(self._player_round_dict) == len(self._player_meta_dict):
-            self.successfully_scraped = 100
-            self._logger.info('Successfully scraped data for all players in tournament {} {}'
-                              .format(self._pga_year, self._pga_tournament))
-        elif len(self._player_round_dict) == 0:
-            self._logger.info(
-                'Unsuccessfully scraped data for tournament {} {}'.format(self._pga_year, self._pga_tournament))
-        elif len(self._player_round_dict) < len(self._player_meta_dict):
-            self.successfully_scraped = (len(self._player_round_dict) / len(self._player_meta_dict)) * 100
-            self._logger.info('Only scraped data for {:.2f}% of players in tournament {} {}'.
-                              format(self.successfully_scraped,
-                                     self._pga_year,
-                                     self._pga_tournament))
-            self._logger.info(
-                'Player rows unsuccessfully scraped are:\n{}'.format(self._unsuccessful_player_round_scrape.keys()))
-
-    def runScrape(self):
-        """Main function for running the scrape, get all necessary info from the page, iterate through
-        players shot charts, try to scrape as much as possible from the JSON requests."""
-        self._logger.info(
-            '\nRunning Scrape for {} {}\nURL is {}\n'.format(self._pga_year, self._pga_tournament,
-                                                             self._tournament_url))
-        self.web_driver.goToURL(self._tournament_url)
-        if not self._getTournamentID():
-            return False
-
-        row_lines = self.web_driver.webDriverWait(self.web_driver.getDriver(),
-                                                  EC.visibility_of_all_elements_located(
-                                                      (By.CSS_SELECTOR, 'tr.line-row.line-row')),
-                                                  'Error locating player elements on page\n{}')
-        if row_lines is None:
-            return False
-
-        # request string for tournament detail
-        tournament_req_str = self.template_wire_html_dict['tournament_detail'].replace(
-            'PGA_YEAR', self._pga_year).replace('TOURNAMENT_ID', self.tournament_id)
-        # scrape JSON of tournament detail
-        if not self._getTournamentJSON(tournament_req_str):
-            self._logger.error('Failed getting tournament details.')
-            return False
+    def _getPlayerRoundRequest(self, main_player_id, round_num):
+        """Build the round detail wire request for a player round"""
+        return {'PlayerID': main_player_id,
+                'RoundNum': round_num,
+                'Wire':
+                    self.template_wire_html_dict['round_detail']
+                        .replace('PGA_YEAR', self._pga_year)
+                        .replace('TOURNAMENT_ID', self.tournament_id)
+                        .replace('ROUND_NUM', round_num)
+                        .replace('MAIN_PLAYER_ID', main_player_id)}
+
+    def _scrapePlannedPlayerRounds(self):
+        """Request only one drawer per group, planned from the pairings seen so far, until every player round
+        from the leaderboard JSON is covered or has been attempted"""
+        planner = DrawerPlanner(self._player_rounds_played)
+        planned_rounds = planner.planRequests(self._player_round_dict)
+        while planned_rounds:
+            player_requests = [self._getPlayerRoundRequest(main_player_id, round_num)
+                               for main_player_id, round_num in planned_rounds]
+            self._logger.info('Requesting wave of {} player round drawers'.format(len(player_requests)))
+            self._prefetchPlayerRequests(player_requests)
+            for request in player_requests:
+                req_str = request['Wire']
+                main_player_id = request['PlayerID']
+                round_num = request['RoundNum']
+                if not self._getPlayerLevelJSON(req_str, main_player_id, round_num):
+                    self._unsuccessful_player_round_scrape[' '.join([main_player_id, round_num])] = req_str
+                    self._logger.warning(
+                        'Unsuccessfully retrieved JSON for player ID {} -- round '
+                        'number {}. Will retry with another player in the group.\n'.format(main_player_id,
+                                                                                          round_num))
+                    # a throttled host is paused by the fetcher's rate limiter, the planner runs out on its own
+                    continue
+                if main_player_id in self._player_round_dict and round_num in self._player_round_dict[main_player_id]:
+                    planner.addGroup(round_num, [main_player_id] + self._player_round_dict[main_player_id][round_num][
+                        'metadata']['playedWith'])
+            self._clearPrefetched()
+            self._saveCheckpointState()
+            planned_rounds = planner.planRequests(self._player_round_dict)
+        self._logger.info('{}'.format(planner))
 
-        # request string for course general info
-        course_gen_req_str = self.template_wire_html_dict['course_general'].replace(
-            'TOURNAMENT_ID', self.tournament_id)
-        # scrape JSON of course general
-        self._getCourseGeneralJSON(course_gen_req_str)
+        # can get course detail data once all players have been added with the courses they played
+        self._getCourseDetailJSON()
+        return True
 
+    def _scrapePlayerRows(self, row_lines):
+        """Click through each player row on the page and wait on the drawer JSON it triggers"""
         successive_failures = 0
         # split up player JSON requests because some data overlaps in the play by play JSON
         for i in range(3):
@@ -416,6 +637,7 @@ class TournamentScraper:
             # remove successful rows
             for row_num in remove_rows:
                 del self._row_dict[row_num]
+            self._saveCheckpointState()
 
         # can get course detail data once all players have been added with the courses they played
         self._getCourseDetailJSON()
@@ -433,26 +655,205 @@ class TournamentScraper:
                     self._logger.warning(
                         'Unsuccessfully retrieved JSON for player ID {} -- round '
                         'number {} Final attempt.\n'.format(main_player_id, round_num))
+        return True
+
+    def _checkScrapeResults(self):
+        """After getting all JSON and converting to dictionaries, check to see how we did"""
+        if len(self._player_round_dict) == len(self._player_meta_dict):
+            self.successfully_scraped = 100
+            self._logger.info('Successfully scraped data for all players in tournament {} {}'
+                              .format(self._pga_year, self._pga_tournament))
+        elif len(self._player_round_dict) == 0:
+            self._logger.info(
+                'Unsuccessfully scraped data for tournament {} {}'.format(self._pga_year, self._pga_tournament))
+        elif len(self._player_round_dict) < len(self._player_meta_dict):
+            self.successfully_scraped = (len(self._player_round_dict) / len(self._player_meta_dict)) * 100
+            self._logger.info('Only scraped data for {:.2f}% of players in tournament {} {}'.
+                              format(self.successfully_scraped,
+                                     self._pga_year,
+                                     self._pga_tournament))
+            self._logger.info(
+                'Player rows unsuccessfully scraped are:\n{}'.format(self._unsuccessful_player_round_scrape.keys()))
+
+    def scrapePage(self):
+        """Load the leaderboard page and read everything needed from it, with a wire fetcher the driver
+        isn't needed again afterwards"""
+        self.web_driver.goToURL(self._tournament_url)
+        if not self._getTournamentID():
+            return False
+        for xpath in self.page_xpath_dict.values():
+            self._findPageText(xpath)
+        return True
+
+    def saveMetrics(self):
+        """Export telemetry of the scrape as JSON and Prometheus text next to the tournament logs"""
+        self.metrics.saveMetrics(self.dir + 'metrics.json', self.dir + 'metrics.prom')
+        self._logger.info('{}'.format(self.metrics))
+
+    def setUploadPipeline(self, upload_pipeline):
+        """Stream player rounds to a MongoUploadPipeline as soon as their drawer is parsed"""
+        self.upload_pipeline = upload_pipeline
+
+    def clearCheckpoint(self):
+        """Remove the checkpoint once the scrape is uploaded, until then a failed upload can resume from it"""
+        if self._checkpoint is not None:
+            self._logger.info('{}'.format(self._checkpoint))
+            self._checkpoint.clearCheckpoint()
+
+    def detachDriver(self):
+        """Stop using the driver, e.g. once it is handed back to a WebDriverPool, only the fetcher is used after"""
+        self.web_driver = None
+
+    def runScrape(self):
+        """Main function for running the scrape, get all necessary info from the page, iterate through
+        players shot charts, try to scrape as much as possible from the JSON requests."""
+        self._logger.info(
+            '\nRunning Scrape for {} {}\nURL is {}\n'.format(self._pga_year, self._pga_tournament,
+                                                             self._tournament_url))
+        if self.web_driver is None:
+            if self.tournament_id is None or self.wire_fetcher is None:
+                self._logger.error('Driver detached before the page was scraped')
+                return False
+        elif not self.scrapePage():
+            return False
+
+        # player rows on the page are only needed when the drawer requests have to be triggered by clicking
+        row_lines = None
+        if self.wire_fetcher is None:
+            row_lines = self.web_driver.webDriverWait(self.web_driver.getDriver(),
+                                                      EC.visibility_of_all_elements_located(
+                                                          (By.CSS_SELECTOR, 'tr.line-row.line-row')),
+                                                      'Error locating player elements on page\n{}')
+            if row_lines is None:
+                return False
+
+        # request string for tournament detail
+        tournament_req_str = self.template_wire_html_dict['tournament_detail'].replace(
+            'PGA_YEAR', self._pga_year).replace('TOURNAMENT_ID', self.tournament_id)
+        # scrape JSON of tournament detail
+        if not self._getTournamentJSON(tournament_req_str):
+            self._logger.error('Failed getting tournament details.')
+            return False
+
+        # request string for course general info
+        course_gen_req_str = self.template_wire_html_dict['course_general'].replace(
+            'TOURNAMENT_ID', self.tournament_id)
+        # scrape JSON of course general
+        self._getCourseGeneralJSON(course_gen_req_str)
+        self._saveCheckpointState()
+
+        # drawers are planned from the leaderboard JSON when fetching directly, otherwise triggered by clicking rows
+        if row_lines is None:
+            if not self._scrapePlannedPlayerRounds():
+                return False
+        elif not self._scrapePlayerRows(row_lines):
+            return False
 
         self._checkScrapeResults()
+        self._logger.info('{}'.format(self.response_cache))
+        if self.recording is not None:
+            self.recording.saveRecording(self.dir + 'recording.json.gz')
+            self._logger.info('Saved {} to {}'.format(self.recording, self.dir + 'recording.json.gz'))
+        if self.archive is not None:
+            self._logger.info('{}'.format(self.archive))
+            self.archive.closeArchive()
         return True
 
-    def __convertPlayerRoundToMongoDBCollection(self):
+    def __convertPlayerRoundToMongoDBCollection(self, player_round_keys=None):
+        """Convert player rounds, optionally only the (player ID, round number) keys given"""
         player_round_collection = []
         for player_id, round_num in self._player_round_dict.items():
             for round_key, round_values in round_num.items():
-                player_round_level = {'playerID': player_id, 'roundNumber': round_key,
-                                      'tournamentID': self.tournament_id, 'pgaYear': self._pga_year}
-                player_round_level.update(round_values['metadata'])
-                player_round_level['holes'] = []
-                for hole_key, hole_values in round_values['play-by-play'].items():
-                    hole_level = {'holeNumber': hole_key, 'shots': []}
-                    for shot in hole_values:
-                        hole_level['shots'].append(shot)
-                    player_round_level['holes'].append(hole_level)
-                player_round_collection.append(player_round_level)
+                if player_round_keys is not None and (player_id, round_key) not in player_round_keys:
+                    continue
+                player_round_collection.append(self._convertPlayerRound(player_id, round_key, round_values))
         return player_round_collection
 
+    def _convertPlayerRound(self, player_id, round_key, round_values):
+        player_round_level = {'playerID': player_id, 'roundNumber': round_key,
+                              'tournamentID': self.tournament_id, 'pgaYear': self._pga_year}
+        player_round_level.update(round_values['metadata'])
+        player_round_level['holes'] = []
+        for hole_key, hole_values in round_values['play-by-play'].items():
+            hole_level = {'holeNumber': hole_key, 'shots': []}
+            for shot in hole_values:
+                hole_level['shots'].append(shot)
+            player_round_level['holes'].append(hole_level)
+        return player_round_level
+
+    def isTournamentComplete(self):
+        return self._tournament_info_dict.get('status') == 'Official'
+
+    def runPoll(self):
+        """Poll a tournament in progress, requires a wire fetcher. The first poll scrapes every player round,
+        later polls re-read the leaderboard and only request drawers for player rounds whose hole count or
+        completion changed. Returns the MongoDB player round documents that changed, None on failure"""
+        if self.wire_fetcher is None:
+            self._logger.error('Live polling needs a wire fetcher')
+            return None
+        if self.tournament_id is None:
+            self.web_driver.goToURL(self._tournament_url)
+            if not self._getTournamentID():
+                return None
+
+        previous_signatures = self._round_signatures
+        self._round_signatures = {}
+        tournament_req_str = self.template_wire_html_dict['tournament_detail'].replace(
+            'PGA_YEAR', self._pga_year).replace('TOURNAMENT_ID', self.tournament_id)
+        tournament_detail_json = self._requestJSON(tournament_req_str, use_cache=False)
+        if not tournament_detail_json:
+            self._logger.error('Failed getting tournament details while polling.')
+            self._round_signatures = previous_signatures
+            return None
+        with self.metrics.timeOperation('parse', 'tournament_detail'):
+            self._scrapeTournamentJSON(tournament_detail_json)
+
+        if len(previous_signatures) == 0:
+            course_gen_req_str = self.template_wire_html_dict['course_general'].replace(
+                'TOURNAMENT_ID', self.tournament_id)
+            self._getCourseGeneralJSON(course_gen_req_str)
+            if not self._scrapePlannedPlayerRounds():
+                self._logger.error('Failed scraping player rounds on the first poll.')
+                # no signatures so the next poll scrapes every player round again
+                self._round_signatures = previous_signatures
+                return None
+            self._checkScrapeResults()
+            return self.__convertPlayerRoundToMongoDBCollection()
+
+        changed_rounds = [(player_id, round_num) for player_id, round_signatures in self._round_signatures.items()
+                          for round_num, signature in round_signatures.items()
+                          if previous_signatures.get(player_id, {}).get(round_num) != signature]
+        # one drawer per group, group mates of a changed player round change with it
+        player_requests = []
+        planned_rounds = set()
+        for player_id, round_num in changed_rounds:
+            if (player_id, round_num) in planned_rounds:
+                continue
+            player_requests.append(self._getPlayerRoundRequest(player_id, round_num))
+            planned_rounds.add((player_id, round_num))
+            if player_id in self._player_round_dict and round_num in self._player_round_dict[player_id]:
+                planned_rounds.update((other_id, round_num) for other_id in
+                                      self._player_round_dict[player_id][round_num]['metadata']['playedWith'])
+        self._logger.info('Poll found {} changed player rounds, requesting {} drawers'.format(
+            len(changed_rounds), len(player_requests)))
+
+        # changed rounds are requested again on purpose even though they were scraped before
+        self._prefetchPlayerRequests(player_requests, use_cache=False, skip_scraped=False)
+        updated_rounds = set()
+        for request in player_requests:
+            round_detail_json = self._requestJSON(request['Wire'], use_cache=False)
+            if not round_detail_json:
+                # signature is forgotten so the next poll requests this drawer again
+                self._round_signatures.get(request['PlayerID'], {}).pop(request['RoundNum'], None)
+                continue
+            with self.metrics.timeOperation('parse', 'round_detail'):
+                updated_players = self._scrapePlayerDetail(request['PlayerID'], request['RoundNum'],
+                                                           round_detail_json, overwrite=True)
+            updated_rounds.update((player_id, request['RoundNum']) for player_id in updated_players)
+        self._clearPrefetched()
+        self._getCourseDetailJSON()
+        return self.__convertPlayerRoundToMongoDBCollection(updated_rounds)
+
     def __convertPlayerMetaToMongoDBCollection(self):
         player_meta_collection = []
         for player_id, meta_values in self._player_meta_dict.items():
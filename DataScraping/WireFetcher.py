@@ -0,0 +1,236 @@
+import concurrent.futures
+import json
+import re
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from DataScraping.HostRateLimiter import HostRateLimiter
+from DataScraping.RequestScheduler import RetryRequest
+from DataScraping.ResponseCache import ResponseCache
+from Logging.ScrapeMetrics import ScrapeMetrics
+
+
+def urlIsBuilt(url_string):
+    """Return True if every placeholder of a wire html template has been replaced"""
+    return url_string is not None and re.search(r'PGA_YEAR|TOURNAMENT_ID|C_ID|ROUND_NUM|MAIN_PLAYER_ID',
+                                                url_string) is None
+
+
+class WireFetcher:
+    """Request lbdata/statdata wire JSON directly over a pooled keep-alive HTTP session
+    instead of waiting for the browser to make the request"""
+
+    # one limiter for every fetcher so all tournaments back off the same host together
+    rate_limiter = HostRateLimiter()
+
+    def __init__(self, called_from_logger, max_workers=8, timeout=10, host_map=None, response_cache=None,
+                 scheduler=None, rate_limiter=None, max_retries=3, proxy_manager=None):
+        """Initialize the pooled session, optional host_map rewrites hosts e.g. to a local stand-in server,
+        optional response cache checked before going to the network, optional RequestScheduler shared with
+        other tournaments runs the network requests instead of this fetcher's own threads, optional
+        HostRateLimiter replaces the shared one, throttled or failed requests are retried max_retries times,
+        optional ProxyManager e.g. WebDriver.proxy_manager routes the session through its best proxy"""
+        self._class_logger = called_from_logger
+        self._response_cache = response_cache
+        self._scheduler = scheduler
+        if rate_limiter is not None:
+            self.rate_limiter = rate_limiter
+        self._max_retries = max_retries
+        self.metrics = ScrapeMetrics()
+        self._max_workers = max_workers
+        self._timeout = timeout
+        self._host_map = host_map if host_map is not None else {}
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max_workers, max_retries=0)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+        self._session.headers.update({'Accept': 'application/json',
+                                      'Referer': 'https://www.pgatour.com/',
+                                      'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 '
+                                                    '(KHTML, like Gecko) Chrome/87.0 Safari/537.36'})
+        self._proxy_manager = proxy_manager
+        self._proxy = None
+        if self._proxy_manager is not None:
+            self._setProxy()
+
+    def updateLogger(self, called_from_logger):
+        self._class_logger = called_from_logger
+
+    def setResponseCache(self, response_cache):
+        self._response_cache = response_cache
+
+    def setMetrics(self, metrics):
+        self.metrics = metrics
+
+    def _setProxy(self):
+        """Route the session through the best scoring proxy, directly if the manager has none"""
+        self._proxy = self._proxy_manager.getProxy()
+        if self._proxy is None:
+            self._class_logger.info('No proxies available, fetching directly')
+            self._session.proxies = {}
+        else:
+            self._class_logger.info('Fetching through proxy {}'.format(self._proxy))
+            self._session.proxies = {'http': 'http://' + self._proxy, 'https': 'http://' + self._proxy}
+
+    def _reportProxyResult(self, proxy, latency, success):
+        """Score the proxy the request went through, move to the next one once it is dropped"""
+        if self._proxy_manager is None or proxy is None:
+            return
+        self._proxy_manager.reportResult(proxy, latency, success)
+        if not self._proxy_manager.isUsable(proxy) and proxy == self._proxy:
+            self._setProxy()
+
+    def _mapURL(self, url_string):
+        for host, stand_in in self._host_map.items():
+            if url_string.startswith(host):
+                return stand_in + url_string[len(host):]
+        return url_string
+
+    def fetchJSON(self, url_string, use_cache=True):
+        """Take url string and return json object, '' on failure to match WebDriver.wireRequestToJSON,
+        use_cache=False always goes to the network but still stores the fresh response"""
+        if use_cache and self._response_cache is not None:
+            cached_json = self._response_cache.getJSON(url_string)
+            if cached_json is not None:
+                self.metrics.incrementCounter('cache_hits', ResponseCache.getEndpointType(url_string, 'other'))
+                return cached_json
+        if self._scheduler is not None:
+            return self._submitScheduled(url_string).result()
+        return self._getJSON(url_string)
+
+    def _getJSON(self, url_string):
+        """Request url over the network at the rate the host allows, throttles, server errors and timeouts are
+        retried after a jittered backoff, the fresh response is stored in the cache"""
+        host = urlsplit(url_string).netloc
+        endpoint = ResponseCache.getEndpointType(url_string, 'other')
+        for attempt in range(self._max_retries + 1):
+            with self.metrics.timeOperation('rate_limit_wait', endpoint):
+                self.rate_limiter.acquire(host)
+            wire_json, error, retry_after = self._requestOnce(url_string, host, endpoint)
+            if error is None:
+                return wire_json
+            if attempt < self._max_retries:
+                time.sleep(self._getRetryBackoff(url_string, endpoint, attempt, error, retry_after))
+        return self._failRequest(url_string, endpoint, error)
+
+    def _submitScheduled(self, url_string):
+        """Queue url on the shared scheduler, waits for the rate limit and backoffs are handed back to the scheduler
+        as RetryRequest so no worker sleeps"""
+        host = urlsplit(url_string).netloc
+        endpoint = ResponseCache.getEndpointType(url_string, 'other')
+        attempts = [0]
+
+        def requestAttempt(url):
+            wait = self.rate_limiter.tryAcquire(host)
+            if wait > 0:
+                self.metrics.observeLatency('rate_limit_wait', endpoint, wait)
+                raise RetryRequest(wait)
+            wire_json, error, retry_after = self._requestOnce(url, host, endpoint)
+            if error is None:
+                return wire_json
+            attempts[0] += 1
+            if attempts[0] <= self._max_retries:
+                raise RetryRequest(self._getRetryBackoff(url, endpoint, attempts[0] - 1, error, retry_after))
+            return self._failRequest(url, endpoint, error)
+
+        return self._scheduler.submitRequest(requestAttempt, url_string, self)
+
+    def _requestOnce(self, url_string, host, endpoint):
+        """One request, return (json object, None, None) or ('', error, retry after) when it should be retried"""
+        start_time = time.monotonic()
+        retry_after = None
+        proxy = self._proxy
+        try:
+            response = self._session.get(self._mapURL(url_string), timeout=self._timeout)
+        except requests.RequestException as e:
+            error = e
+            # per attempt, 'errors' counts urls that failed every attempt
+            self.metrics.incrementCounter('timeouts' if isinstance(e, requests.Timeout) else 'request_errors',
+                                          endpoint)
+            self._reportProxyResult(proxy, time.monotonic() - start_time, False)
+            if isinstance(e, requests.exceptions.ProxyError):
+                # the proxy failed, not the host, don't slow the host down for it but let another request probe
+                self.rate_limiter.releaseProbe(host)
+                return '', error, None
+        else:
+            # any answer from the host means the proxy got through, throttling is the rate limiter's business
+            self._reportProxyResult(proxy, time.monotonic() - start_time, True)
+            self.metrics.observeLatency('fetch', endpoint, time.monotonic() - start_time)
+            self.metrics.addBytes('fetch', endpoint, len(response.content))
+            if response.status_code == 429 or response.status_code >= 500:
+                error = 'HTTP {}'.format(response.status_code)
+                retry_after = self._getRetryAfter(response)
+                self.metrics.incrementCounter('throttled', endpoint)
+            else:
+                # any other answer means the host is keeping up, even a 404
+                self.rate_limiter.reportResult(host, time.monotonic() - start_time, True)
+                return self._parseResponse(url_string, response), None, None
+        self.rate_limiter.reportResult(host, time.monotonic() - start_time, False)
+        return '', error, retry_after
+
+    def _getRetryBackoff(self, url_string, endpoint, attempt, error, retry_after):
+        backoff = self.rate_limiter.getBackoff(attempt, retry_after)
+        self.metrics.incrementCounter('retries', endpoint)
+        self._class_logger.info('Retrying url {} in {:.2f}s after {}'.format(url_string, backoff, error))
+        return backoff
+
+    def _failRequest(self, url_string, endpoint, error):
+        self.metrics.incrementCounter('errors', endpoint)
+        self._class_logger.error('Error fetching url {} after {} attempts\n{}'.format(url_string,
+                                                                                     self._max_retries + 1, error))
+        return ''
+
+    def _parseResponse(self, url_string, response):
+        try:
+            response.raise_for_status()
+            wire_json = json.loads(response.content.decode('utf-8'))
+            if self._response_cache is not None:
+                self._response_cache.putJSON(url_string, wire_json)
+            return wire_json
+        except Exception as e:
+            self._class_logger.error('Error fetching url {}\n{}'.format(url_string, e))
+            return ''
+
+    @staticmethod
+    def _getRetryAfter(response):
+        try:
+            return float(response.headers.get('Retry-After'))
+        except (TypeError, ValueError):
+            return None
+
+    def fetchManyJSON(self, url_strings, use_cache=True):
+        """Fetch a batch of urls with at most max_workers in flight, return dict of url to json object"""
+        url_strings = list(dict.fromkeys(url_strings))
+        if len(url_strings) == 0:
+            return {}
+        if self._scheduler is not None:
+            return self._scheduleManyJSON(url_strings, use_cache)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(self._max_workers, len(url_strings))) as executor:
+            return dict(zip(url_strings, executor.map(lambda url_string: self.fetchJSON(url_string, use_cache),
+                                                      url_strings)))
+
+    def _scheduleManyJSON(self, url_strings, use_cache):
+        """Answer cached urls here and queue the rest on the shared scheduler"""
+        wire_jsons = {}
+        futures = {}
+        for url_string in url_strings:
+            cached_json = None
+            if use_cache and self._response_cache is not None:
+                cached_json = self._response_cache.getJSON(url_string)
+            if cached_json is not None:
+                wire_jsons[url_string] = cached_json
+            else:
+                futures[url_string] = self._submitScheduled(url_string)
+        for url_string, future in futures.items():
+            try:
+                wire_jsons[url_string] = future.result()
+            except Exception:
+                wire_jsons[url_string] = ''
+        return {url_string: wire_jsons[url_string] for url_string in url_strings}
+
+    def closeFetcher(self):
+        """Close the pooled session"""
+        self._session.close()
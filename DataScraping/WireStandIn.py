@@ -0,0 +1,98 @@
+import collections
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+
+class WireStandIn:
+    """Local HTTP stand-in for the lbdata/statdata hosts that serves recorded JSON responses,
+    pass getHostMap() to a WireFetcher to scrape without touching pgatour.com. Faults can be injected to exercise
+    the fetcher's rate limiting, requests above max_rate per second or picked at error_rate answer error_status
+    and every answer is delayed by latency seconds"""
+
+    def __init__(self, responses, port=0, latency=0.0, error_rate=0.0, max_rate=None, error_status=429,
+                 retry_after=None, seed=0):
+        """Initialize with dict of full wire url to recorded json object, port 0 picks a free port"""
+        self._responses = {urlsplit(url).path: body for url, body in responses.items()}
+        self._hosts = {'{0.scheme}://{0.netloc}'.format(urlsplit(url)) for url in responses.keys()}
+        self._latency = latency
+        self._error_rate = error_rate
+        self._max_rate = max_rate
+        self._error_status = error_status
+        self._retry_after = retry_after
+        self._random = random.Random(seed)
+        self._recent_requests = collections.deque()
+        self._lock = threading.Lock()
+        self.request_count = 0
+        self.error_count = 0
+        stand_in = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                if stand_in._latency:
+                    time.sleep(stand_in._latency)
+                if stand_in._injectFault():
+                    self.send_response(stand_in._error_status)
+                    if stand_in._retry_after is not None:
+                        self.send_header('Retry-After', str(stand_in._retry_after))
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                body = stand_in._responses.get(urlsplit(self.path).path)
+                if body is None:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                payload = json.dumps(body).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), _Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def _injectFault(self):
+        """Count the request and decide whether it gets the error status"""
+        with self._lock:
+            self.request_count += 1
+            now = time.monotonic()
+            self._recent_requests.append(now)
+            while self._recent_requests[0] < now - 1:
+                self._recent_requests.popleft()
+            fault = (self._max_rate is not None and len(self._recent_requests) > self._max_rate) or \
+                    (self._error_rate and self._random.random() < self._error_rate)
+            if fault:
+                self.error_count += 1
+            return fault
+
+    def __enter__(self):
+        self.startServer()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stopServer()
+
+    def getURL(self):
+        return 'http://127.0.0.1:{}'.format(self._server.server_address[1])
+
+    def getHostMap(self):
+        """Return host map for WireFetcher rewriting every recorded host to this server"""
+        return {host: self.getURL() for host in self._hosts}
+
+    def startServer(self):
+        self._thread.start()
+
+    def stopServer(self):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,111 @@
+import contextlib
+import json
+import os
+import threading
+import time
+
+
+class ScrapeMetrics:
+    """Latency histograms, payload bytes and counters keyed by operation and endpoint type, e.g. ('wire_wait',
+    'round_detail') or ('dom_wait', 'dom'). One instance per tournament, exported as JSON or Prometheus text"""
+
+    latency_buckets = (.005, .01, .025, .05, .1, .25, .5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+    def __init__(self, labels=None):
+        """Initialize empty metrics, labels e.g. tournament and year are attached to every exported sample"""
+        self.labels = labels if labels is not None else {}
+        self._latencies = {}
+        self._bytes = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return self.__class__.__name__ + ' {}: {}'.format(self.labels, {
+            '{} {}'.format(*key): '{} in {:.2f}s'.format(latency['count'], latency['sum'])
+            for key, latency in self._latencies.items()})
+
+    def observeLatency(self, operation, endpoint, seconds):
+        with self._lock:
+            latency = self._latencies.get((operation, endpoint))
+            if latency is None:
+                latency = {'count': 0, 'sum': 0.0, 'max': 0.0, 'buckets': [0] * len(self.latency_buckets)}
+                self._latencies[(operation, endpoint)] = latency
+            latency['count'] += 1
+            latency['sum'] += seconds
+            latency['max'] = max(latency['max'], seconds)
+            for i, bound in enumerate(self.latency_buckets):
+                if seconds <= bound:
+                    latency['buckets'][i] += 1
+
+    def addBytes(self, operation, endpoint, num_bytes):
+        with self._lock:
+            self._bytes[(operation, endpoint)] = self._bytes.get((operation, endpoint), 0) + num_bytes
+
+    def incrementCounter(self, name, endpoint, amount=1):
+        """Count events such as 'timeouts', 'request_errors', 'retries', 'errors' or 'cache_hits' per endpoint,
+        the endpoint is named by the caller"""
+        with self._lock:
+            self._counters[(name, endpoint)] = self._counters.get((name, endpoint), 0) + amount
+
+    @contextlib.contextmanager
+    def timeOperation(self, operation, endpoint):
+        """Observe the latency of the with block, also when it raises"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observeLatency(operation, endpoint, time.perf_counter() - start)
+
+    def toDict(self):
+        """Return every metric as a JSON serializable dict"""
+        with self._lock:
+            return {
+                'labels': dict(self.labels),
+                'latency_buckets': list(self.latency_buckets),
+                'latencies': [dict(operation=operation, endpoint=endpoint, **latency,
+                                   mean=latency['sum'] / latency['count'])
+                              for (operation, endpoint), latency in sorted(self._latencies.items())],
+                'bytes': [{'operation': operation, 'endpoint': endpoint, 'bytes': num_bytes}
+                          for (operation, endpoint), num_bytes in sorted(self._bytes.items())],
+                'counters': [{'name': name, 'endpoint': endpoint, 'count': count}
+                             for (name, endpoint), count in sorted(self._counters.items())]
+            }
+
+    def _formatLabels(self, **labels):
+        labels = dict(self.labels, **labels)
+        return '{' + ','.join('{}="{}"'.format(key, str(value).replace('"', '\\"'))
+                              for key, value in labels.items()) + '}'
+
+    def toPrometheus(self):
+        """Return metrics in the Prometheus text exposition format"""
+        metrics_dict = self.toDict()
+        lines = ['# TYPE scraper_latency_seconds histogram']
+        for latency in metrics_dict['latencies']:
+            key_labels = {'operation': latency['operation'], 'endpoint': latency['endpoint']}
+            for bound, count in zip(self.latency_buckets, latency['buckets']):
+                lines.append('scraper_latency_seconds_bucket{} {}'.format(
+                    self._formatLabels(le=bound, **key_labels), count))
+            lines.append('scraper_latency_seconds_bucket{} {}'.format(
+                self._formatLabels(le='+Inf', **key_labels), latency['count']))
+            lines.append('scraper_latency_seconds_sum{} {}'.format(self._formatLabels(**key_labels), latency['sum']))
+            lines.append('scraper_latency_seconds_count{} {}'.format(self._formatLabels(**key_labels),
+                                                                     latency['count']))
+        lines.append('# TYPE scraper_payload_bytes_total counter')
+        for payload in metrics_dict['bytes']:
+            lines.append('scraper_payload_bytes_total{} {}'.format(
+                self._formatLabels(operation=payload['operation'], endpoint=payload['endpoint']), payload['bytes']))
+        lines.append('# TYPE scraper_events_total counter')
+        for counter in metrics_dict['counters']:
+            lines.append('scraper_events_total{} {}'.format(
+                self._formatLabels(event=counter['name'], endpoint=counter['endpoint']), counter['count']))
+        return '\n'.join(lines) + '\n'
+
+    def saveMetrics(self, json_path=None, prometheus_path=None):
+        """Write the JSON dump and/or Prometheus text file"""
+        for path, text in ((json_path, lambda: json.dumps(self.toDict(), indent=2)),
+                           (prometheus_path, self.toPrometheus)):
+            if path is None:
+                continue
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            with open(path, 'w') as f:
+                f.write(text())
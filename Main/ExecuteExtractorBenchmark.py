@@ -0,0 +1,43 @@
+import logging
+import timeit
+
+from DataScraping.JSONExtractor import JSONExtractor
+from DataScraping.ResponseCache import ResponseCache
+from DataScraping.TournamentRecording import TournamentRecording
+from DataScraping.TournamentScraper import TournamentScraper, findKeyInJSON
+from Logging.MyLogger import MyLogger
+
+# recorded raw responses, see TournamentScraper(name, year, record=True)
+recording_path = 'tournaments/2020_shriners-hospitals-for-children-open/recording.json.gz'
+num_repeats = 20
+
+if __name__ == '__main__':
+    main_logger = MyLogger('Main', 'Main/logs/extractor_benchmark.log', logging.INFO).getLogger()
+    recording = TournamentRecording.loadRecording(recording_path)
+
+    # group recorded documents by endpoint the same way the scraper hands them to the extractors
+    endpoint_docs = {}
+    for url_string, json_body in recording.responses.items():
+        endpoint = ResponseCache.getEndpointType(url_string)
+        if endpoint == 'course_general':
+            endpoint_docs.setdefault(endpoint, []).extend(json_body['courses'])
+        elif endpoint is not None:
+            endpoint_docs.setdefault(endpoint, []).append(json_body)
+
+    for endpoint, json_docs in endpoint_docs.items():
+        keys = TournamentScraper.json_extractors[endpoint].getKeys()
+        extractor = JSONExtractor(keys)
+
+        # both approaches have to agree before their timings mean anything
+        for json_body in json_docs:
+            expected = {key: findKeyInJSON(json_body, key) for key in keys}
+            if extractor.extract(json_body) != expected:
+                main_logger.error('Extractor mismatch for {} document'.format(endpoint))
+
+        nested_time = min(timeit.repeat(lambda: [{key: findKeyInJSON(json_body, key) for key in keys}
+                                                 for json_body in json_docs], number=1, repeat=num_repeats))
+        extractor_time = min(timeit.repeat(lambda: [extractor.extract(json_body) for json_body in json_docs],
+                                           number=1, repeat=num_repeats))
+        main_logger.info('{}: {} documents, {} keys, nested_lookup {:.6f}s, extractor {:.6f}s, {:.1f}x faster'
+                         .format(endpoint, len(json_docs), len(keys), nested_time, extractor_time,
+                                 nested_time / extractor_time))
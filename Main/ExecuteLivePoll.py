@@ -0,0 +1,16 @@
+import logging
+
+from Logging.MyLogger import MyLogger
+from MongoDB.MongoInitialization import MongoInitialization
+from TournamentRun import TournamentRun
+
+# tournament in progress, polled until the leaderboard is official
+tournament_name = 'waste-management-phoenix-open'
+tournament_year = 2021
+poll_interval = 60
+
+if __name__ == '__main__':
+    main_logger = MyLogger('Main', 'Main/logs/live_poll.log', logging.INFO).getLogger()
+    mongo_obj = MongoInitialization('scraper')
+    tournament_run = TournamentRun(tournament_name, tournament_year, mongo_obj, main_logger)
+    main_logger.info('{}'.format(tournament_run.runLiveTournament(None, poll_interval)))
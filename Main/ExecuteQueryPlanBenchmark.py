@@ -0,0 +1,34 @@
+import logging
+import sys
+
+from Logging.MyLogger import MyLogger
+from MongoDB.MongoInitialization import MongoInitialization
+from MongoDB.QueryCatalog import QueryCatalog
+
+# sample values for the catalog's queries are read from this tournament
+tournament_name = 'waste-management-phoenix-open'
+
+if __name__ == '__main__':
+    main_logger = MyLogger('Main', 'Main/logs/query_plan_benchmark.log', logging.INFO).getLogger()
+    # make sure every collection and index of the deployment exists before explaining against them
+    for called_from in MongoInitialization.collection_indexes:
+        mongo_obj = MongoInitialization(called_from)
+    query_catalog = QueryCatalog(mongo_obj.getTournamentDB(), tournament_name)
+    main_logger.info('{}'.format(query_catalog))
+
+    failed_queries = []
+    for query in query_catalog.getQueries():
+        summary = query_catalog.explainQuery(query)
+        main_logger.info('{} on {}: {}, indexes {}, {} keys and {} docs examined for {} returned in {}ms{}{}'.format(
+            query['name'], query['collection'], sorted(summary['stages']), sorted(summary['indexes']),
+            summary['keys_examined'], summary['docs_examined'], summary['returned'], summary['millis'],
+            ', covered' if summary['covered'] else '', ', full read' if query.get('full_read') else ''))
+        if summary['failed']:
+            failed_queries.append(query['name'])
+            main_logger.error('{} falls back to a collection scan of {}'.format(query['name'], query['collection']))
+
+    if failed_queries:
+        main_logger.error('{} of {} queries scan a collection: {}'.format(
+            len(failed_queries), len(query_catalog.getQueries()), failed_queries))
+        sys.exit(1)
+    main_logger.info('Every query is served by an index')
@@ -0,0 +1,39 @@
+import cProfile
+import logging
+import pstats
+import time
+
+from DataScraping.TournamentScraper import TournamentScraper
+from Logging.MyLogger import MyLogger
+
+# record with TournamentScraper(name, year, record=True) to create tournaments/'pga_year'_'tournament_name'/
+# recording.json.gz, then replay it here to benchmark and profile the parse path without chrome or network
+pga_tournament = 'shriners-hospitals-for-children-open'
+pga_year = '2020'
+num_replays = 5
+profile = False
+
+if __name__ == '__main__':
+    main_logger = MyLogger('Main', 'Main/logs/replay.log', logging.INFO).getLogger()
+    replay_times = []
+    profiler = cProfile.Profile()
+    for i in range(num_replays):
+        scraper = TournamentScraper.fromRecording(pga_tournament, pga_year)
+        # parse path timings shouldn't include log I/O
+        scraper._logger.setLevel(logging.WARNING)
+        start = time.perf_counter()
+        if profile:
+            profiler.enable()
+        success = scraper.runScrape()
+        collections = scraper.convertDictsToMongoDBCollection()
+        if profile:
+            profiler.disable()
+        replay_times.append(time.perf_counter() - start)
+        main_logger.info('Replay {} success {}, {} player rounds in {:.4f}s'.format(i + 1, success,
+                                                                                  len(collections[0]),
+                                                                                  replay_times[-1]))
+
+    main_logger.info('Best replay {:.4f}s, mean replay {:.4f}s over {} replays'.format(
+        min(replay_times), sum(replay_times) / len(replay_times), num_replays))
+    if profile:
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(25)
@@ -4,9 +4,15 @@ from Logging.MyLogger import MyLogger
 from MongoDB.MongoInitialization import MongoInitialization
 from SGRun import SGRun
 
+# browser sessions the tournament dropdown is split across
+num_shards = 4
+years_to_scrape = ('2016', '2017')
+# set of (tournament name, year) pairs to refresh instead of every tournament in years_to_scrape
+tournament_years = None
+
 if __name__ == '__main__':
     main_logger = MyLogger('Main', 'Main/logs/main.log', logging.INFO).getLogger()
     mongo_obj = MongoInitialization('sg')
-    sg_run = SGRun(mongo_obj, main_logger)
-    res = sg_run.runSG()
-    main_logger.info('{}'.format(res))
\ No newline at end of file
+    sg_run = SGRun(mongo_obj, main_logger, num_shards)
+    res = sg_run.runSG(years_to_scrape, tournament_years)
+    main_logger.info('{}'.format(res))
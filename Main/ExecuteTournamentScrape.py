@@ -7,6 +7,8 @@ import pandas as pd
 from Logging.MyLogger import MyLogger
 from MongoDB.MongoDownload import MongoDownload
 from MongoDB.MongoInitialization import MongoInitialization
+from DataScraping.RequestScheduler import RequestScheduler
+from SeleniumDriver.WebDriverPool import WebDriverPool
 from TournamentRun import TournamentRun
 
 # tournaments_path = 'tournaments/FailedTournamentList.csv'
@@ -14,6 +16,11 @@ tournaments_path = 'tournaments/TournamentList.csv'
 
 if __name__ == '__main__':
     max_drivers = 2
+    max_driver_uses = 10
+    # drivers are only leased for the page, so more tournaments than drivers can be in flight
+    max_tournaments = 8
+    max_request_workers = 16
+    host_limits = {'lbdata.pgatour.com': 8, 'statdata.pgatour.com': 2}
     main_logger = MyLogger('Main', 'Main/logs/main.log', logging.INFO).getLogger()
     mongo_obj = MongoInitialization('scraper')
     tournament_df = pd.read_csv(tournaments_path, delimiter=',')
@@ -25,12 +32,16 @@ if __name__ == '__main__':
     tournaments = filter_tournaments.apply(lambda row: TournamentRun(row[0], row[1], mongo_obj, main_logger),
                                            axis=1).tolist()
     iter_tournaments = iter(tournaments)
+    # warm drivers are leased to each tournament instead of starting a new chrome per tournament
+    driver_pool = WebDriverPool(main_logger, max_drivers, max_driver_uses)
+    # every wire request of every tournament shares one worker pool with per host limits
+    scheduler = RequestScheduler(main_logger, max_request_workers, host_limits)
 
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_drivers) as executor:
-        # Only schedule max_drivers amount of futures to start
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_tournaments) as executor:
+        # Only schedule max_tournaments amount of futures to start
         futures = {
-            executor.submit(tournament.runTournament, None, True): tournament
-            for tournament in itertools.islice(iter_tournaments, max_drivers)
+            executor.submit(tournament.runScheduledTournament, driver_pool, scheduler): tournament
+            for tournament in itertools.islice(iter_tournaments, max_tournaments)
         }
 
         while futures:
@@ -45,8 +56,13 @@ if __name__ == '__main__':
                 main_logger.info('{}'.format(future.result()))
 
             for tournament in itertools.islice(iter_tournaments, len(finished)):
-                future = executor.submit(tournament.runTournament, None, True)
+                future = executor.submit(tournament.runScheduledTournament, driver_pool, scheduler)
                 futures[future] = tournament
 
+    main_logger.info('{}'.format(driver_pool))
+    main_logger.info('{}'.format(scheduler))
+    driver_pool.closePool()
+    scheduler.closeScheduler()
+
     failed_scrape_df = pd.DataFrame(columns=['Name', 'Year'], data=tournaments[0].failed_scrape_list)
     failed_scrape_df.to_csv('tournaments/FailedTournamentList.csv', index=False, header=True)
\ No newline at end of file
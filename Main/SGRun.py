@@ -1,21 +1,32 @@
+import concurrent.futures
+
 from DataScraping.SGScraper import SGScraper
 from MongoDB.MongoUpload import MongoUploadSG
 
 
 class SGRun:
 
-    def __init__(self, mongo_client, logger):
+    def __init__(self, mongo_client, logger, num_shards=1):
+        """num_shards splits the tournament dropdown across that many browser sessions scraping in parallel"""
         self._mongo_client = mongo_client
         self._logger = logger
+        self._num_shards = num_shards
         self._success = False
 
     def __repr__(self):
         return self.__class__.__name__ + \
                f'\nScraped SG and Uploaded to MongoDB: {self._success}\n'
 
-    def runSG(self):
+    def runSG(self, years_to_scrape=('2016', '2017'), tournament_years=None):
+        """Scrape every tournament for years_to_scrape, or only the (tournament name, year) pairs in
+        tournament_years e.g. to refresh a single season"""
         self._logger.info('Scraping SG Stats')
-        mongo_collection = self.__getMongoDBCollectionsFromScrape()
+        if tournament_years is not None:
+            years_to_scrape = None
+        if self._num_shards > 1:
+            mongo_collection = self.__getMongoDBCollectionsFromShards(years_to_scrape, tournament_years)
+        else:
+            mongo_collection = self.__getMongoDBCollectionsFromScrape(years_to_scrape, None, tournament_years)
         if mongo_collection:
             self._logger.info('Uploading SG Stats To MongoDB\n')
             result = self.__uploadMongoDBCollections(mongo_collection)
@@ -23,19 +34,53 @@ class SGRun:
             self._success = True
         return self.__repr__()
 
-    def __getMongoDBCollectionsFromScrape(self):
-        sg_scraper = SGScraper()
+    def __getMongoDBCollectionsFromScrape(self, years_to_scrape, tournament_names, tournament_years,
+                                          shard_name=None):
+        sg_scraper = SGScraper(shard_name)
         mongo_collection = None
-        if sg_scraper.runScrape(['2016', '2017']):
-            self._logger.info('{}\n'.format(sg_scraper))
-            mongo_collection = sg_scraper.getSGCollection()
+        try:
+            if sg_scraper.runScrape(years_to_scrape, tournament_names, tournament_years):
+                self._logger.info('{}\n'.format(sg_scraper))
+                mongo_collection = sg_scraper.getSGCollection()
+        finally:
+            sg_scraper.web_driver.closeDriver()
+
+        return mongo_collection
 
-        sg_scraper.web_driver.closeDriver()
-        sg_scraper.web_driver.proxy_list.pop()
+    def __getMongoDBCollectionsFromShards(self, years_to_scrape, tournament_years):
+        """Deal the wanted dropdown options round robin to num_shards scrapers and merge their collections"""
+        option_scraper = SGScraper('options')
+        options = option_scraper.getTournamentOptions()
+        option_scraper.web_driver.closeDriver()
+        if options is None:
+            return None
+        options = [tournament_name for tournament_name in options
+                   if SGScraper.isWanted(tournament_name, None, years_to_scrape, None, tournament_years)]
+        num_shards = min(self._num_shards, len(options))
+        self._logger.info('Scraping SG Stats for {} tournaments in {} shards'.format(len(options), num_shards))
 
+        mongo_collection = []
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(num_shards, 1)) as executor:
+            futures = {executor.submit(self.__getMongoDBCollectionsFromScrape, years_to_scrape,
+                                       set(options[shard::num_shards]), tournament_years,
+                                       'shard {}'.format(shard)): shard
+                       for shard in range(num_shards)}
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    shard_collection = future.result()
+                except Exception as e:
+                    # e.g. the shard's browser session couldn't start, the other shards still upload
+                    self._logger.error('SG shard {} raised, its tournaments are not uploaded\n{}'.format(
+                        futures[future], e), exc_info=True)
+                    continue
+                if shard_collection is None:
+                    self._logger.error('SG shard {} failed, its tournaments are not uploaded'.format(
+                        futures[future]))
+                    continue
+                mongo_collection.extend(shard_collection)
         return mongo_collection
 
     def __uploadMongoDBCollections(self, sg_stats_col):
         mongo_upload = MongoUploadSG(self._mongo_client.getTournamentDB())
         mongo_upload.uploadSGStats(sg_stats_col)
-        return mongo_upload
\ No newline at end of file
+        return mongo_upload
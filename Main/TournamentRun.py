@@ -1,16 +1,23 @@
+import time
+
 from DataScraping.TournamentScraper import TournamentScraper
+from DataScraping.WireFetcher import WireFetcher
 from MongoDB.MongoUpload import MongoUploadTournament
+from MongoDB.MongoUploadPipeline import MongoUploadPipeline
+from SeleniumDriver.WebDriver import WebDriver
 
 
 class TournamentRun:
     failed_scrape_list = []
 
-    def __init__(self, name, year, mongo_client, logger):
-        """Get tournament name and year from .csv file to initialize class"""
+    def __init__(self, name, year, mongo_client, logger, direct_fetch=True):
+        """Get tournament name and year from .csv file to initialize class,
+        direct_fetch requests the wire JSON over HTTP instead of clicking through every player row"""
         self.name = name
         self.year = str(year)
         self._mongo_client = mongo_client
         self._logger = logger
+        self._direct_fetch = direct_fetch
         self._webdriver = None
         self._success = False
 
@@ -20,50 +27,162 @@ class TournamentRun:
 
     def runTournament(self, driver, remove_driver):
         self._logger.info('Scraping Tournament {} -- PGA Year {} \n'.format(self.name, self.year))
-        mongo_collection = self.__getMongoDBCollectionsFromScrape(driver, remove_driver)
-        if mongo_collection:
-            self._logger.info('Uploading Tournament {} -- PGA Year {} To MongoDB\n'.format(self.name, self.year))
-            result = self.__uploadMongoDBCollections(mongo_collection)
+        upload_pipeline = self.__startUploadPipeline()
+        try:
+            mongo_collection, scraped_tournament = self.__getMongoDBCollectionsFromScrape(driver, remove_driver,
+                                                                                          upload_pipeline)
+            self.__finishUploadPipeline(mongo_collection, upload_pipeline, scraped_tournament)
+        finally:
+            # the writer must not be left holding queued rounds when the scrape raises
+            upload_pipeline.closePipeline()
+        return self.__repr__()
+
+    def runPooledTournament(self, driver_pool):
+        """Run tournament on a warm driver leased from a WebDriverPool, the pool keeps the driver afterwards"""
+        with driver_pool.leaseDriver() as driver:
+            return self.runTournament(driver, False)
+
+    def runScheduledTournament(self, driver_pool, scheduler):
+        """Lease a driver only while the leaderboard page is read, every wire request then goes through the
+        RequestScheduler shared by all tournaments so the driver is free for the next tournament"""
+        self._logger.info('Scraping Tournament {} -- PGA Year {} \n'.format(self.name, self.year))
+        fetcher = WireFetcher(self._logger, scheduler=scheduler, proxy_manager=WebDriver.proxy_manager)
+        upload_pipeline = self.__startUploadPipeline()
+        try:
+            with driver_pool.leaseDriver() as driver:
+                scraped_tournament = TournamentScraper(self.name, self.year, driver, fetcher, archive=True)
+                scraped_tournament.setUploadPipeline(upload_pipeline)
+                page_scraped = scraped_tournament.scrapePage()
+                scraped_tournament.detachDriver()
+            mongo_collection = None
+            if page_scraped:
+                mongo_collection = self.__runScrapeAttempts(scraped_tournament)
+            else:
+                self._logger.error('Scraping for -- {} -- failed. Adding to failure list.\n'.format(
+                    scraped_tournament))
+                self.failed_scrape_list.append({'Name': self.name, 'Year': self.year})
+            scraped_tournament.saveMetrics()
+            scraped_tournament.archive.closeArchive()
+            fetcher.closeFetcher()
+            self.__finishUploadPipeline(mongo_collection, upload_pipeline, scraped_tournament)
+        finally:
+            upload_pipeline.closePipeline()
+        return self.__repr__()
+
+    def runLiveTournament(self, driver, poll_interval=60, max_polls=None):
+        """Poll a tournament in progress until it is official or max_polls is reached, each poll only upserts
+        the player rounds that changed, everything else is uploaded once polling stops"""
+        self._logger.info('Polling Tournament {} -- PGA Year {} \n'.format(self.name, self.year))
+        fetcher = WireFetcher(self._logger, proxy_manager=WebDriver.proxy_manager)
+        scraped_tournament = TournamentScraper(self.name, self.year, driver, fetcher, checkpoint=False,
+                                               archive=True)
+        mongo_upload = MongoUploadTournament(self._mongo_client.getTournamentDB(), self.year, self.name)
+        num_polls = 0
+        while max_polls is None or num_polls < max_polls:
+            poll_start = time.time()
+            player_rounds = scraped_tournament.runPoll()
+            num_polls += 1
+            if player_rounds is None:
+                self._logger.error('Poll {} failed for {}\n'.format(num_polls, scraped_tournament))
+            else:
+                self._logger.info('Poll {} upserting {} player rounds in {:.2f}s\n'.format(
+                    num_polls, len(player_rounds), time.time() - poll_start))
+                if player_rounds:
+                    mongo_upload.uploadPlayerRounds(player_rounds)
+            if scraped_tournament.isTournamentComplete():
+                break
+            time.sleep(max(0.0, poll_interval - (time.time() - poll_start)))
+
+        if scraped_tournament.tournament_id is not None:
+            mongo_collection = self.__buildMongoDBCollections(scraped_tournament)
+            del mongo_collection['Player Rounds']
+            result = self.__uploadMongoDBCollections(mongo_collection, mongo_upload)
             self._logger.info('Result of MongoDB upload: \n{}\n'.format(result))
             self._success = True
+        scraped_tournament.saveMetrics()
+        scraped_tournament.archive.closeArchive()
+        fetcher.closeFetcher()
+        if driver is None:
+            scraped_tournament.web_driver.closeDriver()
         return self.__repr__()
 
     def getDriverObj(self):
         return self._webdriver
 
-    def __getMongoDBCollectionsFromScrape(self, driver, remove_driver):
-        """Get MongoDB collections from the Tournament Scraper,
-        pass in a driver if one exists"""
-        scraped_tournament = TournamentScraper(self.name, self.year, driver)
-        mongo_collection = None
-        for i in range(3):
-            if scraped_tournament.runScrape():
-                self._logger.info('Attempt {} successful at scraping {}\n'.format(str(i + 1), scraped_tournament))
-                scraped_collection = scraped_tournament.convertDictsToMongoDBCollection()
-                mongo_collection = {'Tournament Scrape Status': {'tournamentName': self.name,
-                                                                 'pgaYear': self.year,
-                                                                 'tournamentID': scraped_tournament.tournament_id,
-                                                                 'percentPlayersScraped': '{:.2f}'.format(
-                                                                     scraped_tournament.successfully_scraped)},
-                                    'Player Rounds': scraped_collection[0],
-                                    'Player Metadata': scraped_collection[1],
-                                    'Course Metadata': scraped_collection[2],
-                                    'Tournament Details': scraped_collection[3]}
-                break
-        else:
-            self._logger.error('Scraping for -- {} -- failed. Adding to failure list.\n'.format(scraped_tournament))
-            self.failed_scrape_list.append({'Name': self.name, 'Year': self.year})
+    def __getMongoDBCollectionsFromScrape(self, driver, remove_driver, upload_pipeline=None):
+        """Get MongoDB collections and the Tournament Scraper they came from,
+        pass in a driver if one exists, player rounds also stream to the upload pipeline while scraping"""
+        fetcher = WireFetcher(self._logger, proxy_manager=WebDriver.proxy_manager) if self._direct_fetch else None
+        scraped_tournament = TournamentScraper(self.name, self.year, driver, fetcher, archive=True)
+        scraped_tournament.setUploadPipeline(upload_pipeline)
+        mongo_collection = self.__runScrapeAttempts(scraped_tournament)
+        scraped_tournament.saveMetrics()
+        scraped_tournament.archive.closeArchive()
+
+        if fetcher is not None:
+            fetcher.closeFetcher()
 
         if remove_driver:
             scraped_tournament.web_driver.closeDriver()
-            scraped_tournament.web_driver.proxy_list.pop()
         else:
             self._webdriver = scraped_tournament.web_driver.getDriver()
 
-        return mongo_collection
+        return mongo_collection, scraped_tournament
 
-    def __uploadMongoDBCollections(self, collection_dict):
+    def __runScrapeAttempts(self, scraped_tournament):
+        """Try the scrape up to 3 times, return the MongoDB collections or None and add to the failure list"""
+        for i in range(3):
+            if scraped_tournament.runScrape():
+                self._logger.info('Attempt {} successful at scraping {}\n'.format(str(i + 1), scraped_tournament))
+                return self.__buildMongoDBCollections(scraped_tournament)
+        self._logger.error('Scraping for -- {} -- failed. Adding to failure list.\n'.format(scraped_tournament))
+        self.failed_scrape_list.append({'Name': self.name, 'Year': self.year})
+        return None
+
+    def __buildMongoDBCollections(self, scraped_tournament):
+        scraped_collection = scraped_tournament.convertDictsToMongoDBCollection()
+        return {'Tournament Scrape Status': {'tournamentName': self.name,
+                                             'pgaYear': self.year,
+                                             'tournamentID': scraped_tournament.tournament_id,
+                                             'percentPlayersScraped': '{:.2f}'.format(
+                                                 scraped_tournament.successfully_scraped)},
+                'Player Rounds': scraped_collection[0],
+                'Player Metadata': scraped_collection[1],
+                'Course Metadata': scraped_collection[2],
+                'Tournament Details': scraped_collection[3]}
+
+    def __startUploadPipeline(self):
         mongo_upload = MongoUploadTournament(self._mongo_client.getTournamentDB(), self.year, self.name)
+        return MongoUploadPipeline(mongo_upload, self._logger)
+
+    def __finishUploadPipeline(self, mongo_collection, upload_pipeline, scraped_tournament):
+        """Queue everything the pipeline hasn't streamed yet, e.g. rounds restored from a checkpoint, wait for the
+        writer to drain and only then mark the tournament scraped and drop its checkpoint"""
+        if mongo_collection:
+            self._logger.info('Uploading Tournament {} -- PGA Year {} To MongoDB\n'.format(self.name, self.year))
+            mongo_collection['Player Rounds'] = [
+                player_round for player_round in mongo_collection['Player Rounds']
+                if (player_round['playerID'], player_round['roundNumber']) not in upload_pipeline.submitted_keys]
+            for key, value in mongo_collection.items():
+                if key in upload_pipeline.upload_methods and value:
+                    upload_pipeline.submitUpload(key, value)
+        upload_pipeline.closePipeline()
+        if not mongo_collection:
+            return
+        if upload_pipeline.errors > 0:
+            # rounds are missing in MongoDB, no scrape status so the tournament is scraped again
+            self._logger.error('{} upload errors for {} {}, not marking it scraped. Adding to failure list.\n'.format(
+                upload_pipeline.errors, self.year, self.name))
+            self.failed_scrape_list.append({'Name': self.name, 'Year': self.year})
+            return
+        upload_pipeline.mongo_upload.uploadTournamentScrapeStatus(mongo_collection['Tournament Scrape Status'])
+        self._logger.info('Result of MongoDB upload: \n{}\n'.format(upload_pipeline.mongo_upload))
+        scraped_tournament.clearCheckpoint()
+        self._success = True
+
+    def __uploadMongoDBCollections(self, collection_dict, mongo_upload=None):
+        if mongo_upload is None:
+            mongo_upload = MongoUploadTournament(self._mongo_client.getTournamentDB(), self.year, self.name)
         for key, value in collection_dict.items():
             if key == 'Tournament Scrape Status':
                 mongo_upload.uploadTournamentScrapeStatus(value)
@@ -0,0 +1,86 @@
+import json
+import os
+import re
+
+import pyarrow.parquet as pq
+
+
+class DFMirrorCache:
+    """Local Parquet mirror of the DF documents read from MongoDB, one file per source document e.g. one
+    year/course/round of tournament_df. A manifest per collection and tournament stamps every file with the _id and
+    dfVersion of its document, a file is only downloaded again when its document's version changed"""
+
+    def __init__(self, mirror_dir='tournaments/DFs/mirror/'):
+        """Initialize mirror directory"""
+        self._mirror_dir = mirror_dir
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self._mirror_dir, exist_ok=True)
+
+    def __repr__(self):
+        return 'DF Mirror Cache {}: {} hits, {} misses'.format(self._mirror_dir, self.hits, self.misses)
+
+    def _getDir(self, collection_name, tournament_name):
+        return os.path.join(self._mirror_dir, collection_name, re.sub(r'[^\w.-]', '_', tournament_name))
+
+    def _getManifestPath(self, collection_name, tournament_name):
+        return os.path.join(self._getDir(collection_name, tournament_name), 'manifest.json')
+
+    def getManifest(self, collection_name, tournament_name):
+        """Return dict of document _id string to {'version', 'file'} of every mirrored document"""
+        manifest_path = self._getManifestPath(collection_name, tournament_name)
+        if not os.path.exists(manifest_path):
+            return {}
+        try:
+            with open(manifest_path, 'r') as f:
+                return json.load(f)
+        except ValueError:
+            return {}
+
+    def saveManifest(self, collection_name, tournament_name, manifest):
+        manifest_path = self._getManifestPath(collection_name, tournament_name)
+        os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+        # written next to the manifest and renamed so a crash never leaves half a manifest
+        with open(manifest_path + '.tmp', 'w') as f:
+            json.dump(manifest, f)
+        os.replace(manifest_path + '.tmp', manifest_path)
+
+    def isCurrent(self, manifest, doc_id, version):
+        """True if the document is mirrored with this version and its file still exists"""
+        entry = manifest.get(str(doc_id))
+        if entry is None or entry['version'] != version or not os.path.exists(entry['file']):
+            self.misses += 1
+            return False
+        self.hits += 1
+        return True
+
+    def writeTable(self, collection_name, tournament_name, manifest, doc_id, version, file_name, table):
+        """Mirror a document's table as file_name.parquet and stamp it in the manifest"""
+        table_dir = self._getDir(collection_name, tournament_name)
+        os.makedirs(table_dir, exist_ok=True)
+        file_path = os.path.join(table_dir, re.sub(r'[^\w.-]', '_', file_name) + '.parquet')
+        pq.write_table(table, file_path + '.tmp', compression='zstd')
+        os.replace(file_path + '.tmp', file_path)
+        manifest[str(doc_id)] = {'version': version, 'file': file_path}
+
+    @staticmethod
+    def readTable(manifest, doc_id, columns=None):
+        """Read a mirrored document's table, optionally only the columns it has of columns"""
+        parquet_file = pq.ParquetFile(manifest[str(doc_id)]['file'])
+        if columns is not None:
+            columns = [column for column in columns if column in parquet_file.schema_arrow.names]
+        return parquet_file.read(columns=columns)
+
+    @staticmethod
+    def removeTable(manifest, doc_id):
+        """Drop a document from the manifest and remove its file, e.g. when its new version has no rows"""
+        entry = manifest.pop(str(doc_id), None)
+        if entry is not None and os.path.exists(entry['file']):
+            os.remove(entry['file'])
+
+    @staticmethod
+    def pruneManifest(manifest, doc_ids):
+        """Remove the files of documents no longer upstream, doc_ids are the _ids still there"""
+        keep_ids = {str(doc_id) for doc_id in doc_ids}
+        for doc_id in [doc_id for doc_id in manifest if doc_id not in keep_ids]:
+            DFMirrorCache.removeTable(manifest, doc_id)
@@ -1,14 +1,19 @@
-from functools import reduce
-
+import gridfs
 import pandas as pd
+import pyarrow as pa
+
+from MongoDB.MongoUpload import MongoUploadDF
 
 
 class MongoDownload:
+    # fields besides tournamentName that identify one DF document, used to name its mirrored file
+    df_key_fields = {'tournament_df': ('pgaYear', 'courseID', 'roundNum'), 'raw_sg_df': ('pgaYear',)}
 
-    def __init__(self, mongo_obj):
-        """For uploading collection objects to MongoDB"""
+    def __init__(self, mongo_obj, df_mirror=None):
+        """For downloading collection objects from MongoDB, DFs are read through the optional DFMirrorCache"""
         self._tournament_db = mongo_obj.getTournamentDB()
         self._logger = mongo_obj.getLogger()
+        self._df_mirror = df_mirror
 
     def getTournamentsScraped(self):
         tournament_scrape_status_col = self._tournament_db['tournament_scrape_status']
@@ -19,21 +24,138 @@ class MongoDownload:
                 successfully_scraped_tournaments.append((tournament['tournamentName'], tournament['pgaYear']))
         return successfully_scraped_tournaments
 
-    def getTournamentDF(self, tournament_name):
-        tournament_df_col = self._tournament_db['tournament_df']
-        tournament_df = pd.DataFrame()
-        for round_based_doc in tournament_df_col.find({'tournamentName': tournament_name}):
-            round_based_df = pd.DataFrame(round_based_doc['df'])
-            tournament_df = tournament_df.append(round_based_df)
-        return tournament_df
-
-    def getRawSG_DF(self, tournament_name):
-        raw_sg_df_col = self._tournament_db['raw_sg_df']
-        raw_sg_df = pd.DataFrame()
-        for round_based_doc in raw_sg_df_col.find({'tournamentName': tournament_name}):
-            round_based_df = pd.DataFrame(round_based_doc['df'])
-            raw_sg_df = raw_sg_df.append(round_based_df)
-        return raw_sg_df
+    @staticmethod
+    def getDFProjection(columns):
+        """Records documents are projected to the columns on the server, arrow documents always carry every column"""
+        projection = {'_id': 0, 'dfFormat': 1, 'dfArrow': 1, 'dfGridFSID': 1}
+        if columns is None:
+            projection['df'] = 1
+        else:
+            projection.update({'df.' + column: 1 for column in columns})
+        return projection
+
+    def _decodeDFDocument(self, df_doc, columns=None):
+        """Arrow table of a DF document of either format, None when it has no rows"""
+        if df_doc.get('dfFormat', MongoUploadDF.records_format) == MongoUploadDF.records_format:
+            records = df_doc.get('df', [])
+            return pa.Table.from_pylist(records) if len(records) > 0 else None
+        if df_doc.get('dfGridFSID') is not None:
+            ipc_bytes = gridfs.GridFSBucket(self._tournament_db, bucket_name=MongoUploadDF.gridfs_bucket) \
+                .open_download_stream(df_doc['dfGridFSID']).read()
+        else:
+            ipc_bytes = df_doc['dfArrow']
+        table = MongoUploadDF.arrowIPCToTable(ipc_bytes)
+        if columns is not None:
+            table = table.select([column for column in columns if column in table.column_names])
+        return table if table.num_rows > 0 else None
+
+    @staticmethod
+    def _concatTables(tables):
+        """Concatenate tables promoting mismatched types, categorical columns of arrow documents are decoded when
+        the same column is plain strings in records documents"""
+        try:
+            return pa.concat_tables(tables, promote_options='permissive')
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            decoded_tables = []
+            for table in tables:
+                for i, field in enumerate(table.schema):
+                    if pa.types.is_dictionary(field.type):
+                        table = table.set_column(i, field.name, table.column(i).cast(field.type.value_type))
+                decoded_tables.append(table)
+            return pa.concat_tables(decoded_tables, promote_options='permissive')
+
+    def _readDFDocuments(self, collection_name, query, columns=None, batch_size=50):
+        """Decode the DF of every matching document into Arrow columns and concatenate once, documents may be
+        stored as records or as Arrow IPC, columns reads only those fields"""
+        projection = self.getDFProjection(columns)
+        tables = []
+        for df_doc in self._tournament_db[collection_name].find(query, projection, batch_size=batch_size):
+            try:
+                table = self._decodeDFDocument(df_doc, columns)
+            except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+                # mixed python types in a column, arrow can't type it so the whole read falls back to pandas
+                self._logger.warning('Arrow could not type {} records, reading with pandas\n{}'.format(
+                    collection_name, e))
+                return self._readDFDocumentsWithPandas(collection_name, query, columns, batch_size)
+            if table is not None:
+                tables.append(table)
+        if len(tables) == 0:
+            return pd.DataFrame()
+        try:
+            df = self._concatTables(tables).to_pandas()
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) as e:
+            self._logger.warning('Arrow could not combine {} records, reading with pandas\n{}'.format(
+                collection_name, e))
+            return self._readDFDocumentsWithPandas(collection_name, query, columns, batch_size)
+        return df if columns is None else df.reindex(columns=list(columns))
+
+    def _readMirroredDFDocuments(self, collection_name, tournament_name, columns=None, batch_size=50):
+        """Read a tournament's DF documents from the local mirror, only documents that are new or whose dfVersion
+        changed are downloaded, the check is one query for the _id and version of each document"""
+        collection = self._tournament_db[collection_name]
+        key_fields = self.df_key_fields[collection_name]
+        query = {'tournamentName': tournament_name}
+        doc_keys = {doc['_id']: doc for doc in collection.find(
+            query, {'_id': 1, 'dfVersion': 1, **{key: 1 for key in key_fields}})}
+        manifest = self._df_mirror.getManifest(collection_name, tournament_name)
+        stale_ids = [doc_id for doc_id, doc in doc_keys.items()
+                     if not self._df_mirror.isCurrent(manifest, doc_id, doc.get('dfVersion', 0))]
+        if stale_ids:
+            projection = dict(self.getDFProjection(None), _id=1)
+            for df_doc in collection.find({'_id': {'$in': stale_ids}}, projection, batch_size=batch_size):
+                table = self._decodeDFDocument(df_doc)
+                if table is None:
+                    # the new version has no rows, the file of the old one must not be read any more
+                    self._df_mirror.removeTable(manifest, df_doc['_id'])
+                    continue
+                doc = doc_keys[df_doc['_id']]
+                self._df_mirror.writeTable(collection_name, tournament_name, manifest, df_doc['_id'],
+                                           doc.get('dfVersion', 0), '_'.join(str(doc.get(key)) for key in key_fields),
+                                           table)
+            self._logger.info('Mirrored {} of {} {} documents for {}'.format(
+                len(stale_ids), len(doc_keys), collection_name, tournament_name))
+        self._df_mirror.pruneManifest(manifest, doc_keys.keys())
+        self._df_mirror.saveManifest(collection_name, tournament_name, manifest)
+
+        tables = [self._df_mirror.readTable(manifest, doc_id, columns) for doc_id in doc_keys
+                  if str(doc_id) in manifest]
+        tables = [table for table in tables if table.num_rows > 0]
+        if len(tables) == 0:
+            return pd.DataFrame()
+        df = self._concatTables(tables).to_pandas()
+        return df if columns is None else df.reindex(columns=list(columns))
+
+    def _readDFDocumentsWithPandas(self, collection_name, query, columns, batch_size):
+        df_list = []
+        for df_doc in self._tournament_db[collection_name].find(query, self.getDFProjection(columns),
+                                                                 batch_size=batch_size):
+            if df_doc.get('dfFormat', MongoUploadDF.records_format) == MongoUploadDF.records_format:
+                if df_doc.get('df'):
+                    df_list.append(pd.DataFrame(df_doc['df']))
+            else:
+                table = self._decodeDFDocument(df_doc, columns)
+                if table is not None:
+                    df_list.append(table.to_pandas())
+        df = pd.concat(df_list, ignore_index=True) if df_list else pd.DataFrame()
+        return df if columns is None or df.empty else df.reindex(columns=list(columns))
+
+    def _readTournamentDF(self, collection_name, tournament_name, columns=None):
+        if self._df_mirror is not None:
+            try:
+                return self._readMirroredDFDocuments(collection_name, tournament_name, columns)
+            except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError, OSError) as e:
+                # OSError covers mirror files removed or unreadable since the manifest was read
+                self._logger.warning('Could not mirror {} of {}, reading from MongoDB\n{}'.format(
+                    collection_name, tournament_name, e))
+        return self._readDFDocuments(collection_name, {'tournamentName': tournament_name}, columns)
+
+    def getTournamentDF(self, tournament_name, columns=None):
+        """Tournament DF of every year, course and round, optionally only the given columns"""
+        return self._readTournamentDF('tournament_df', tournament_name, columns)
+
+    def getRawSG_DF(self, tournament_name, columns=None):
+        """Raw SG DF of every year, optionally only the given columns"""
+        return self._readTournamentDF('raw_sg_df', tournament_name, columns)
 
     def getPlayerNames(self):
         player_meta_col = self._tournament_db['player_metadata']
@@ -42,80 +164,120 @@ class MongoDownload:
             players.append(player)
         return players
 
+    @staticmethod
+    def getYearlyLookupPipeline(tournament_name, from_collection, as_field, unwind=False):
+        """Pipeline joining each year's tournament detail to the from_collection docs of that year's tournament ID
+        and year, unwind streams one output doc per joined doc instead of one array per year"""
+        pipeline = [
+            {'$match': {'tournamentName': tournament_name}},
+            # joined on tournament ID and year together so each year only reads its own docs through the
+            # (tournamentID, pgaYear) index
+            {'$lookup': {'from': from_collection, 'let': {'tid': '$tournamentID', 'year': '$pgaYear'},
+                         'pipeline': [{'$match': {'$expr': {'$and': [{'$eq': ['$tournamentID', '$$tid']},
+                                                                     {'$eq': ['$pgaYear', '$$year']}]}}}],
+                         'as': as_field}}]
+        if unwind:
+            pipeline.append({'$unwind': '$' + as_field})
+        return pipeline
+
     def getTournamentDetailsByYear(self, tournament_name):
         yearly_tournaments = {}
         tournament_detail_col = self._tournament_db['tournament_detail']
-        tournament_detail_cur = tournament_detail_col.find(
-            {'tournamentName': tournament_name})
-        if tournament_detail_cur.count() == 0:
+        for tournament in tournament_detail_col.find({'tournamentName': tournament_name}):
+            yearly_tournaments[tournament['pgaYear']] = tournament
+        if len(yearly_tournaments) == 0:
             self._logger.error('No tournament details found for {}'.format(tournament_name))
             return None
-        for tournament in tournament_detail_cur:
-            yearly_tournaments[tournament['pgaYear']] = tournament
-        tournament_ids = set()
-        tournament_ids.add(reduce(lambda d, key: d.get(key) if d else None, 'tournamentID', yearly_tournaments))
+        tournament_ids = {details['tournamentID'] for details in yearly_tournaments.values()}
         if len(tournament_ids) > 1:
-            self._logger.error('Mismatched tournament IDs for tournament {}'.format(tournament_name))
+            self._logger.info('Tournament {} changed IDs across years {}'.format(tournament_name, tournament_ids))
+        return yearly_tournaments
+
+    def getCoursesByYear(self, tournament_name):
+        """Tournament details by year with each year's course meta joined on the server in 'courses'"""
+        yearly_tournaments = {}
+        tournament_detail_col = self._tournament_db['tournament_detail']
+        for tournament in tournament_detail_col.aggregate(
+                self.getYearlyLookupPipeline(tournament_name, 'course_metadata', 'courses')):
+            yearly_tournaments[tournament['pgaYear']] = tournament
+        if len(yearly_tournaments) == 0:
+            self._logger.error('No tournament details found for {}'.format(tournament_name))
+            return None
         return yearly_tournaments
 
+    @staticmethod
+    def getPlayerRoundsPipeline(tournament_name):
+        pipeline = MongoDownload.getYearlyLookupPipeline(tournament_name, 'player_round', 'playerRound', unwind=True)
+        pipeline.extend([
+            {'$replaceRoot': {'newRoot': '$playerRound'}},
+            {'$sort': {'pgaYear': 1, 'courseId': 1, 'roundNumber': 1}}])
+        return pipeline
+
+    def iterPlayerRoundsByYearCourse(self, tournament_name):
+        """Stream (pgaYear, courseId, player round) sorted by year then course, every year is matched on its own
+        tournament ID"""
+        tournament_detail_col = self._tournament_db['tournament_detail']
+        for player_round in tournament_detail_col.aggregate(self.getPlayerRoundsPipeline(tournament_name),
+                                                            allowDiskUse=True):
+            yield player_round['pgaYear'], player_round['courseId'], player_round
+
     def getPlayerRoundsForTournament(self, tournament_name, yearly_tournaments=None):
         if yearly_tournaments is None:
             yearly_tournaments = self.getTournamentDetailsByYear(tournament_name)
+            if yearly_tournaments is None:
+                return None
 
-        tournament_id = ''
         for year, details in yearly_tournaments.items():
-            tournament_id = details['tournamentID']
             details.update({'playerRounds': []})
 
-        player_round_col = self._tournament_db['player_round']
-        player_round_cur = player_round_col.find({'tournamentID': tournament_id})
-        if player_round_cur.count() == 0:
-            self._logger.error('No player rounds found for tournament ID {}'.format(tournament_id))
+        num_rounds = 0
+        for pga_year, _, player_round in self.iterPlayerRoundsByYearCourse(tournament_name):
+            if pga_year in yearly_tournaments:
+                yearly_tournaments[pga_year]['playerRounds'].append(player_round)
+                num_rounds += 1
+        if num_rounds == 0:
+            self._logger.error('No player rounds found for tournament {}'.format(tournament_name))
             return None
-        for player_round in player_round_cur:
-            if player_round['pgaYear'] in yearly_tournaments:
-                yearly_tournaments[player_round['pgaYear']]['playerRounds'].append(player_round)
         return yearly_tournaments
 
     def getCourseMetaForTournament(self, tournament_name, yearly_tournaments=None):
+        courses_by_year = self.getCoursesByYear(tournament_name)
+        if courses_by_year is None:
+            return None
         if yearly_tournaments is None:
-            yearly_tournaments = self.getTournamentDetailsByYear(tournament_name)
+            yearly_tournaments = courses_by_year
+        else:
+            for year, details in yearly_tournaments.items():
+                details.update({'courses': courses_by_year.get(year, {}).get('courses', [])})
 
-        tournament_id = ''
-        for year, details in yearly_tournaments.items():
-            tournament_id = details['tournamentID']
-            details.update({'courses': []})
-
-        course_metadata_col = self._tournament_db['course_metadata']
-        course_meta_cur = course_metadata_col.find({'tournamentID': tournament_id})
-        if course_meta_cur.count() == 0:
-            self._logger.error('No course meta found for tournament ID {}'.format(tournament_id))
+        if not any(details['courses'] for details in yearly_tournaments.values()):
+            self._logger.error('No course meta found for tournament {}'.format(tournament_name))
             return None
-        for course_meta in course_meta_cur:
-            if course_meta['pgaYear'] in yearly_tournaments:
-                yearly_tournaments[course_meta['pgaYear']]['courses'].append(course_meta)
         return yearly_tournaments
 
     def getSGStatsForTournament(self, tournament_name, tournament_name_sg, yearly_tournaments=None):
         if yearly_tournaments is None:
             yearly_tournaments = self.getTournamentDetailsByYear(tournament_name)
+            if yearly_tournaments is None:
+                return None
 
         for year, details in yearly_tournaments.items():
             details.update({'sgStats': []})
 
+        num_stats = 0
         sg_stats_col = self._tournament_db['sg_stats']
-        sg_stats_cur = sg_stats_col.find(
-            {'tournamentName': tournament_name_sg}, {'_id': 0})
-        if sg_stats_cur.count() == 0:
+        for sg_summary in sg_stats_col.find({'tournamentName': tournament_name_sg,
+                                             'pgaYear': {'$in': list(yearly_tournaments.keys())}}, {'_id': 0}):
+            yearly_tournaments[sg_summary['pgaYear']]['sgStats'].append(sg_summary)
+            num_stats += 1
+        if num_stats == 0:
             self._logger.error('No sg stats found for {}'.format(tournament_name_sg))
             return None
-        for sg_summary in sg_stats_cur:
-            if sg_summary['pgaYear'] in yearly_tournaments:
-                yearly_tournaments[sg_summary['pgaYear']]['sgStats'].append(sg_summary)
         return yearly_tournaments
 
     def consolidateTournamentInfo(self, tournament_name):
-        yearly_tournaments = self.getTournamentDetailsByYear(tournament_name)
-        yearly_tournaments = self.getPlayerRoundsForTournament(tournament_name, yearly_tournaments)
-        yearly_tournaments = self.getCourseMetaForTournament(tournament_name, yearly_tournaments)
-        return yearly_tournaments
\ No newline at end of file
+        """Tournament details by year with 'courses' and 'playerRounds', joined and bucketed by year on the server"""
+        yearly_tournaments = self.getCourseMetaForTournament(tournament_name)
+        if yearly_tournaments is None:
+            return None
+        return self.getPlayerRoundsForTournament(tournament_name, yearly_tournaments)
@@ -1,43 +1,135 @@
 import logging
+import threading
+
 import pymongo
+from pymongo.errors import OperationFailure
 
 from Logging.MyLogger import MyLogger
 from config import MY_MONGO_DB_KEY
 
 
 class MongoInitialization:
+    """Shared MongoClient per connection string and options for the whole process, every entry point and scrape
+    worker draws sockets from the same pool. Collections and indexes are bootstrapped once per deployment, a
+    marker doc records the schema version each called_from was set up with"""
+
+    # pooling, compression and timeouts, compressors that aren't installed are dropped by pymongo with a warning
+    client_options = {'maxPoolSize': 64, 'minPoolSize': 0, 'maxIdleTimeMS': 300000, 'compressors': 'zstd,snappy',
+                      'connectTimeoutMS': 10000, 'serverSelectionTimeoutMS': 15000, 'socketTimeoutMS': 120000,
+                      'retryWrites': True}
+    # called_from -> collection name -> unique index
+    collection_indexes = {
+        'scraper': {
+            'tournament_detail': [('tournamentID', 1), ('pgaYear', -1)],
+            'player_metadata': [('playerID', 1)],
+            'player_round': [('playerID', 1), ('tournamentID', 1), ('pgaYear', -1), ('roundNumber', 1)],
+            'course_metadata': [('courseID', 1), ('tournamentID', 1), ('pgaYear', -1)],
+            'tournament_scrape_status': [('tournamentName', 1), ('pgaYear', -1)]},
+        'sg': {
+            'sg_stats': [('tournamentName', 1), ('pgaYear', -1), ('playerName', 1)]},
+        'df': {
+            'tournament_df': [('tournamentName', 1), ('courseID', 1), ('pgaYear', -1), ('roundNum', 1)],
+            'raw_sg_df': [('tournamentName', 1), ('pgaYear', -1)]}
+    }
+    # called_from -> collection name -> secondary indexes for the reads in QueryCatalog, the unique indexes above
+    # serve the upserts by document key
+    query_indexes = {
+        'scraper': {
+            'tournament_detail': [[('tournamentName', 1), ('pgaYear', -1)]],
+            # $lookup by tournamentID, then filtered by year and sorted by course and round
+            'player_round': [[('tournamentID', 1), ('pgaYear', -1), ('courseId', 1), ('roundNumber', 1)]],
+            'course_metadata': [[('tournamentID', 1), ('pgaYear', -1)]],
+            'tournament_scrape_status': [[('tournamentID', 1), ('pgaYear', -1)]]},
+        'df': {
+            # cover the mirror's version check, it projects only these fields
+            'tournament_df': [[('tournamentName', 1), ('pgaYear', -1), ('courseID', 1), ('roundNum', 1),
+                               ('dfVersion', 1), ('_id', 1)]],
+            'raw_sg_df': [[('tournamentName', 1), ('pgaYear', -1), ('dfVersion', 1), ('_id', 1)]]}
+    }
+    # bump when collection_indexes or query_indexes change so every deployment bootstraps again
+    schema_version = 2
+    bootstrap_collection = 'deployment_bootstrap'
 
-    def __init__(self, called_from):
-        """For connecting and set up to MongoDB"""
+    _clients = {}
+    _bootstrapped = set()
+    _clients_lock = threading.Lock()
+    # held while bootstrapping, which talks to the server, so getClient isn't blocked meanwhile
+    _bootstrap_lock = threading.Lock()
+
+    def __init__(self, called_from, **client_options):
+        """For connecting and set up to MongoDB, client_options override the class client_options"""
         self.connection_str = '{}'.format(MY_MONGO_DB_KEY)
         self._logger = MyLogger('MongoDB', 'MongoDB/logs/mongodb.log', logging.INFO).getLogger()
-        self._logger.info('Connecting to MongoDB...\n')
-        self._client = pymongo.MongoClient(self.connection_str)
+        self._client = self.getClient(self.connection_str, self._logger, **client_options)
         self._tournament_db = self._client.tournament_db
-        self._logger.info('Client description {}\n'.format(self._client))
-        self._logger.info('Tournament DB description {}\n'.format(self._tournament_db))
-        col_names = self._tournament_db.collection_names()
-        self._logger.info('TournamentDB has the following collections {}\n'.
-                          format(col_names))
-        if called_from == 'scraper':
-            self._createCollection('tournament_detail', [('tournamentID', 1), ('pgaYear', -1)])
-            self._createCollection('player_metadata', [('playerID', 1)])
-            self._createCollection('player_round',
-                                   [('playerID', 1), ('tournamentID', 1), ('pgaYear', -1), ('roundNumber', 1)])
-            self._createCollection('course_metadata', [('courseID', 1), ('tournamentID', 1), ('pgaYear', -1)])
-            self._createCollection('tournament_scrape_status', [('tournamentName', 1), ('pgaYear', -1)])
-        elif called_from == 'sg':
-            self._createCollection('sg_stats', [('tournamentName', 1), ('pgaYear', -1), ('playerName', 1)])
-        elif called_from == 'df':
-            self._createCollection('tournament_df', [('tournamentName', 1), ('courseID', 1),
-                                                     ('pgaYear', -1), ('roundNum', 1)])
-            self._createCollection('raw_sg_df', [('tournamentName', 1), ('pgaYear', -1)])
-
-    def _createCollection(self, collection_name, index_dict):
-        if collection_name not in self._tournament_db.collection_names():
-            new_col = self._tournament_db[collection_name]
-            idx = new_col.create_index(index_dict, unique=True)
+        self._bootstrapCollections(called_from)
+
+    @classmethod
+    def getClient(cls, connection_str, logger, **client_options):
+        """Return the process wide client for connection_str and options, created on first use"""
+        options = dict(cls.client_options, **client_options)
+        key = (connection_str, tuple(sorted(options.items())))
+        with cls._clients_lock:
+            client = cls._clients.get(key)
+            if client is None:
+                logger.info('Connecting to MongoDB...\n')
+                # connects in the background, the first operation waits for server selection
+                client = pymongo.MongoClient(connection_str, **options)
+                cls._clients[key] = client
+                logger.info('Client description {}\n'.format(client))
+            return client
+
+    def _bootstrapCollections(self, called_from):
+        """Create called_from's collections and indexes unless this deployment was already set up with the current
+        schema version, a started process checks the marker doc at most once"""
+        if called_from not in self.collection_indexes:
+            return
+        with self._bootstrap_lock:
+            if (id(self._client), called_from) in self._bootstrapped:
+                return
+            bootstrap_col = self._tournament_db[self.bootstrap_collection]
+            marker = bootstrap_col.find_one({'_id': called_from})
+            if marker is None or marker.get('schemaVersion') != self.schema_version:
+                col_names = set(self._tournament_db.list_collection_names())
+                self._logger.info('Bootstrapping {} collections, TournamentDB has {}\n'.format(called_from, col_names))
+                created = [self._createCollection(collection_name, index_list, col_names)
+                           for collection_name, index_list in self.collection_indexes[called_from].items()]
+                for collection_name, index_lists in self.query_indexes.get(called_from, {}).items():
+                    created.extend(self._createIndex(collection_name, index_list) for index_list in index_lists)
+                if None in created:
+                    # leave the marker behind so the next process tries the refused indexes again
+                    self._logger.error('Bootstrapping {} left indexes missing\n'.format(called_from))
+                    return
+                bootstrap_col.replace_one({'_id': called_from}, {'_id': called_from,
+                                                                 'schemaVersion': self.schema_version}, upsert=True)
+            self._bootstrapped.add((id(self._client), called_from))
+
+    def _createCollection(self, collection_name, index_list, col_names):
+        idx = self._createIndex(collection_name, index_list, unique=True)
+        if collection_name not in col_names and idx is not None:
             self._logger.info('Created {} Collection with index {}\n'.format(collection_name, idx))
+        return idx
+
+    def _createIndex(self, collection_name, index_list, unique=False):
+        """Ensure an index, return its name or None if the server refused it"""
+        try:
+            # create_index is a no-op when the index already exists
+            idx = self._tournament_db[collection_name].create_index(index_list, unique=unique)
+        except OperationFailure as e:
+            # e.g. duplicate keys for a unique index or an existing index with the same keys and other options
+            self._logger.error('Could not create {} index {}\n{}'.format(collection_name, index_list, e))
+            return None
+        self._logger.info('Ensured {} index {}\n'.format(collection_name, idx))
+        return idx
+
+    @classmethod
+    def closeClients(cls):
+        with cls._clients_lock:
+            for client in cls._clients.values():
+                client.close()
+            cls._clients.clear()
+        with cls._bootstrap_lock:
+            cls._bootstrapped.clear()
 
     def __repr__(self):
         return 'MongoDB Client is {}\nTournament DB is {}\n'.format(self._client, self._tournament_db)
@@ -46,4 +138,4 @@ class MongoInitialization:
         return self._tournament_db
 
     def getLogger(self):
-        return self._logger
\ No newline at end of file
+        return self._logger
@@ -1,15 +1,71 @@
 import logging
+import threading
+
+import gridfs
+import pandas as pd
+import pyarrow as pa
+from bson.binary import Binary
+from pymongo import ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError
+from pymongo.write_concern import WriteConcern
 
 from Logging.MyLogger import MyLogger
 
 
+def bulkWrite(collection, operations, logger, batch_size=500, write_concern=None):
+    """Send operations as unordered bulk writes of batch_size operations, optional write concern dict
+    e.g. {'w': 1}, return dict of aggregate counts from the bulk results. Unacknowledged writes, {'w': 0}, have no
+    counts, they are counted as sent"""
+    if write_concern is not None:
+        collection = collection.with_options(write_concern=WriteConcern(**write_concern))
+    counts = {'upserted': 0, 'matched': 0, 'modified': 0, 'errors': 0, 'unacknowledged': 0}
+    for start in range(0, len(operations), batch_size):
+        try:
+            result = collection.bulk_write(operations[start:start + batch_size], ordered=False)
+            if not result.acknowledged:
+                # reading the counts of an unacknowledged result raises InvalidOperation
+                counts['unacknowledged'] += len(operations[start:start + batch_size])
+                continue
+            bulk_counts = {'upserted': result.upserted_count, 'matched': result.matched_count,
+                           'modified': result.modified_count}
+        except BulkWriteError as e:
+            # unordered, everything but the failed operations was still written, a write concern error alone
+            # raises with no write errors
+            write_errors = e.details.get('writeErrors', [])
+            concern_errors = e.details.get('writeConcernErrors', [])
+            logger.error('Bulk write to {} had {} write errors and {} write concern errors, first {}'.format(
+                collection.name, len(write_errors), len(concern_errors), write_errors[:1] or concern_errors[:1]))
+            bulk_counts = {'upserted': e.details.get('nUpserted', 0), 'matched': e.details.get('nMatched', 0),
+                           'modified': e.details.get('nModified', 0)}
+            counts['errors'] += len(write_errors) + len(concern_errors)
+        for key, count in bulk_counts.items():
+            counts[key] += count
+    logger.info('Bulk wrote {} operations to {}: {}\n'.format(len(operations), collection.name, counts))
+    return counts
+
+
+def bulkUpsert(collection, documents, key_fields, logger, batch_size=500, write_concern=None):
+    """Replace each document by its key fields with unordered bulk writes"""
+    operations = [ReplaceOne({key: document[key] for key in key_fields}, document, upsert=True)
+                  for document in documents]
+    return bulkWrite(collection, operations, logger, batch_size, write_concern)
+
+
 class MongoUploadTournament:
+    # player IDs known to be in player_metadata, loaded with one query and shared by every tournament uploaded
+    # in this process
+    known_player_ids = set()
+    _known_players_loaded = False
+    _known_player_lock = threading.Lock()
 
-    def __init__(self, tournament_db, tournament_year, tournament_name):
-        """For uploading tournament scrape collection objects to MongoDB"""
+    def __init__(self, tournament_db, tournament_year, tournament_name, batch_size=500, write_concern=None):
+        """For uploading tournament scrape collection objects to MongoDB, documents are upserted with unordered
+        bulk writes of batch_size operations and the optional write concern dict"""
         self._tournament_db = tournament_db
         self._year = tournament_year
         self._name = tournament_name
+        self._batch_size = batch_size
+        self._write_concern = write_concern
         self._logger = MyLogger('MongoDB {} {}'.format(self._year, self._name),
                                 'tournaments/{}_{}/logs/tournament_mongodb.log'.format(self._year, self._name),
                                 logging.INFO).getLogger()
@@ -40,45 +96,46 @@ class MongoUploadTournament:
             self._tournament_detail_upload = True
 
     def uploadPlayerMetadata(self, player_metadata):
-        for player in player_metadata:
-            self._player_metadata_overall += 1
-            if self._tournament_db.player_metadata.find_one({"playerID": player['playerID']}) is None:
-                result = self._tournament_db.player_metadata.insert_one(player)
-                if result is not None:
-                    self._logger.info(
-                        'Inserted player metadata into collection with id {}\n'.format(result.inserted_id))
-                    self._player_metadata_upload += 1
+        """Insert players not yet in the collection, players already known to this process are skipped and the
+        rest are $setOnInsert upserts in bulk so existing players are never rewritten"""
+        self._player_metadata_overall += len(player_metadata)
+        with self._known_player_lock:
+            if not MongoUploadTournament._known_players_loaded:
+                self.known_player_ids.update(player['playerID'] for player in
+                                             self._tournament_db.player_metadata.find({}, {'playerID': 1, '_id': 0}))
+                MongoUploadTournament._known_players_loaded = True
+            new_players = list({player['playerID']: player for player in player_metadata
+                                if player['playerID'] not in self.known_player_ids}.values())
+        if len(new_players) == 0:
+            self._logger.info('All {} players already in player metadata\n'.format(len(player_metadata)))
+            return {'upserted': 0, 'matched': 0, 'modified': 0, 'errors': 0, 'unacknowledged': 0}
+        operations = [UpdateOne({'playerID': player['playerID']},
+                                {'$setOnInsert': {key: value for key, value in player.items() if key != 'playerID'}},
+                                upsert=True)
+                      for player in new_players]
+        counts = bulkWrite(self._tournament_db.player_metadata, operations, self._logger, self._batch_size,
+                           self._write_concern)
+        self._player_metadata_upload += counts['upserted'] + counts['unacknowledged']
+        if counts['errors'] == 0:
+            with self._known_player_lock:
+                self.known_player_ids.update(player['playerID'] for player in new_players)
+        return counts
 
     def uploadPlayerRounds(self, player_rounds):
-        for player in player_rounds:
-            self._player_round_overall += 1
-            result = self._tournament_db.player_round.replace_one(
-                {'playerID': player['playerID'], 'tournamentID': player['tournamentID'],
-                 'pgaYear': player['pgaYear'], 'roundNumber': player['roundNumber']}, player, upsert=True)
-            if result is not None:
-                if result.upserted_id is not None:
-                    self._logger.info('Inserted player rounds into collection with id {}\n'.format(result.upserted_id))
-                else:
-                    self._logger.info('Updated existing player rounds with key {}\n'.format(
-                        {'playerID': player['playerID'], 'tournamentID': player['tournamentID'],
-                         'pgaYear': player['pgaYear'], 'roundNumber': player['roundNumber']}))
-                self._player_round_upload += 1
+        self._player_round_overall += len(player_rounds)
+        counts = bulkUpsert(self._tournament_db.player_round, player_rounds,
+                            ('playerID', 'tournamentID', 'pgaYear', 'roundNumber'), self._logger, self._batch_size,
+                            self._write_concern)
+        self._player_round_upload += counts['upserted'] + counts['matched'] + counts['unacknowledged']
+        return counts
 
     def uploadCourseMetadata(self, course_metadata):
-        for course in course_metadata:
-            self._course_metadata_overall += 1
-            result = self._tournament_db.course_metadata.replace_one(
-                {'courseID': course['courseID'], 'tournamentID': course['tournamentID'],
-                 'pgaYear': course['pgaYear']}, course, upsert=True)
-            if result is not None:
-                if result.upserted_id is not None:
-                    self._logger.info(
-                        'Inserted course metadata into collection with id {}\n'.format(result.upserted_id))
-                else:
-                    self._logger.info('Updated existing course metadata with key {}\n'.format(
-                        {'courseID': course['courseID'], 'tournamentID': course['tournamentID'],
-                         'pgaYear': course['pgaYear']}))
-                self._course_metadata_upload += 1
+        self._course_metadata_overall += len(course_metadata)
+        counts = bulkUpsert(self._tournament_db.course_metadata, course_metadata,
+                            ('courseID', 'tournamentID', 'pgaYear'), self._logger, self._batch_size,
+                            self._write_concern)
+        self._course_metadata_upload += counts['upserted'] + counts['matched'] + counts['unacknowledged']
+        return counts
 
     def uploadTournamentScrapeStatus(self, scrape_status):
         result = self._tournament_db.tournament_scrape_status.replace_one(
@@ -108,9 +165,11 @@ class MongoUploadTournament:
 
 class MongoUploadSG:
 
-    def __init__(self, tournament_db):
-        """For uploading SG collection objects to MongoDB"""
+    def __init__(self, tournament_db, batch_size=500, write_concern=None):
+        """For uploading SG collection objects to MongoDB with unordered bulk writes"""
         self._tournament_db = tournament_db
+        self._batch_size = batch_size
+        self._write_concern = write_concern
         self._logger = MyLogger('MongoDB SG',
                                 'tournaments/SG/logs/sg_mongodb.log',
                                 logging.INFO).getLogger()
@@ -121,30 +180,28 @@ class MongoUploadSG:
         return 'MongoDB SG Upload Status: {}'.format(self._getUploadStatus())
 
     def uploadSGStats(self, sg_stats_list):
-        for sg_stats in sg_stats_list:
-            self._sg_stats_overall += 1
-            result = self._tournament_db.sg_stats.replace_one(
-                {'playerName': sg_stats['playerName'], 'tournamentName': sg_stats['tournamentName'],
-                 'pgaYear': sg_stats['pgaYear']}, sg_stats, upsert=True)
-            if result is not None:
-                if result.upserted_id is not None:
-                    self._logger.info('Inserted SG stats into collection with id {}\n'.format(result.upserted_id))
-                else:
-                    self._logger.info('Updated existing sg stats with key {}\n'.format(
-                        {'playerName': sg_stats['playerName'], 'tournamentName': sg_stats['tournamentName'],
-                         'pgaYear': sg_stats['pgaYear']}))
-                self._sg_stats_upload += 1
+        self._sg_stats_overall += len(sg_stats_list)
+        counts = bulkUpsert(self._tournament_db.sg_stats, sg_stats_list, ('playerName', 'tournamentName', 'pgaYear'),
+                            self._logger, self._batch_size, self._write_concern)
+        self._sg_stats_upload += counts['upserted'] + counts['matched'] + counts['unacknowledged']
 
     def _getUploadStatus(self):
         return 'SG Stats Uploaded: {} of {} possible\n'.format(self._sg_stats_upload, self._sg_stats_overall)
 
 
 class MongoUploadDF:
+    # dfFormat of a DF document, records is a 'df' array of row dicts (documents without dfFormat),
+    # arrow is a zstd compressed Arrow IPC stream in 'dfArrow' or, when larger than gridfs_threshold, in GridFS
+    records_format = 1
+    arrow_format = 2
+    gridfs_bucket = 'df_arrow'
+    gridfs_threshold = 8 * 1024 * 1024
 
-    def __init__(self, tournament_db, tournament_name):
-        """For uploading tournament DF to MongoDB"""
+    def __init__(self, tournament_db, tournament_name, df_format=arrow_format):
+        """For uploading tournament DF to MongoDB, df_format is records_format or arrow_format"""
         self._tournament_db = tournament_db
         self._name = tournament_name
+        self._df_format = df_format
         self._logger = MyLogger('MongoDB Tournament DF {}'.format(self._name),
                                 'tournaments/DFs/{}/logs/tournament_mongodb.log'.format(self._name),
                                 logging.INFO).getLogger()
@@ -154,7 +211,71 @@ class MongoUploadDF:
     def __repr__(self):
         return 'MongoDB DF Upload Status: {}'.format(self._getUploadStatus())
 
+    @staticmethod
+    def dfToArrowIPC(df):
+        """Serialize DF as a zstd compressed Arrow IPC stream"""
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema, options=pa.ipc.IpcWriteOptions(compression='zstd')) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+    @staticmethod
+    def arrowIPCToTable(ipc_bytes):
+        return pa.ipc.open_stream(ipc_bytes).read_all()
+
+    def _encodeDF(self, query, upload_dict):
+        """Return the $set and $unset of upload_dict with its 'df' DataFrame stored in the DF format, DataFrames
+        arrow can't type are stored as records"""
+        df = upload_dict['df']
+        values = {key: value for key, value in upload_dict.items() if key != 'df'}
+        if self._df_format == self.arrow_format:
+            if not isinstance(df, pd.DataFrame):
+                df = pd.DataFrame(df)
+            try:
+                ipc_bytes = self.dfToArrowIPC(df)
+            except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) as e:
+                # mixed python types in a column
+                self._logger.warning('Arrow could not type DF {}, storing records\n{}'.format(query, e))
+            else:
+                values.update({'dfFormat': self.arrow_format, 'dfRows': len(df), 'dfColumns': list(df.columns),
+                               'dfBytes': len(ipc_bytes)})
+                if len(ipc_bytes) > self.gridfs_threshold:
+                    values['dfGridFSID'] = gridfs.GridFSBucket(self._tournament_db, bucket_name=self.gridfs_bucket) \
+                        .upload_from_stream('{}'.format(query), ipc_bytes, metadata=query)
+                    return values, {'df': '', 'dfArrow': ''}
+                values['dfArrow'] = Binary(ipc_bytes)
+                return values, {'df': '', 'dfGridFSID': ''}
+        values['df'] = df.to_dict('records') if isinstance(df, pd.DataFrame) else df
+        values['dfFormat'] = self.records_format
+        return values, {'dfArrow': '', 'dfGridFSID': '', 'dfRows': '', 'dfColumns': '', 'dfBytes': ''}
+
+    def _uploadDF(self, collection, query, upload_dict):
+        previous = collection.find_one(query, {'dfGridFSID': 1}) or {}
+        values, unset = self._encodeDF(query, upload_dict)
+        # every upload bumps the version so local mirrors of the DF know to download it again
+        update = {'$set': values, '$unset': unset, '$inc': {'dfVersion': 1}}
+        try:
+            result = collection.update_one(query, update, upsert=True)
+        except Exception:
+            # the document still points at the previous file, the new one would be orphaned
+            if values.get('dfGridFSID') is not None:
+                gridfs.GridFSBucket(self._tournament_db, bucket_name=self.gridfs_bucket).delete(values['dfGridFSID'])
+            raise
+        if result.upserted_id is not None:
+            self._logger.info('Inserted DF into {} with id {}\n'.format(collection.name, result.upserted_id))
+        else:
+            self._logger.info('Updated existing DF in {} with key {}\n'.format(collection.name, query))
+        # the previous file is only removed once no document points at it
+        if previous.get('dfGridFSID') is not None:
+            try:
+                gridfs.GridFSBucket(self._tournament_db, bucket_name=self.gridfs_bucket) \
+                    .delete(previous['dfGridFSID'])
+            except gridfs.errors.NoFile:
+                self._logger.warning('GridFS file {} of {} already deleted'.format(previous['dfGridFSID'], query))
+
     def uploadTournamentDF(self, upload_dict):
+        """Upsert one course/year/round of the tournament DF, upload_dict['df'] is a DataFrame or list of records"""
         try:
             tournament_name = upload_dict['tournamentName']
             pga_year = upload_dict['pgaYear']
@@ -164,35 +285,21 @@ class MongoUploadDF:
                               format(pga_year, tournament_name, course_id, round_num))
             query = {'tournamentName': tournament_name, 'courseID': course_id,
                      'pgaYear': pga_year, 'roundNum': round_num}
-            values = {'$set': upload_dict}
-            result = self._tournament_db.tournament_df.update(query, values, upsert=True)
-            if result is not None:
-                if not result['updatedExisting']:
-                    self._logger.info('Inserted Tournament DF into collection with id {}\n'.format(result['upserted']))
-                else:
-                    self._logger.info('Updated existing Tournament DF with key {}\n'.format(
-                        {'tournamentName': tournament_name, 'courseID': course_id,
-                         'pgaYear': pga_year, 'roundNum': round_num}))
+            self._uploadDF(self._tournament_db.tournament_df, query, upload_dict)
         except Exception as e:
             self._logger.error('Problem uploading DF {}'.format(e), exc_info=True)
         else:
             self._tournament_df_upload = True
 
     def uploadRawSG_DF(self, upload_dict):
+        """Upsert one year of the raw SG DF, upload_dict['df'] is a DataFrame or list of records"""
         try:
             tournament_name = upload_dict['tournamentName']
             pga_year = upload_dict['pgaYear']
             self._logger.info('Attempting to upload {} {}'.
                               format(pga_year, tournament_name))
             query = {'tournamentName': tournament_name, 'pgaYear': pga_year}
-            values = {'$set': upload_dict}
-            result = self._tournament_db.raw_sg_df.update(query, values, upsert=True)
-            if result is not None:
-                if not result['updatedExisting']:
-                    self._logger.info('Inserted Raw SG DF into collection with id {}\n'.format(result['upserted']))
-                else:
-                    self._logger.info('Updated existing Raw SG DF with key {}\n'.format(
-                        {'tournamentName': tournament_name, 'pgaYear': pga_year}))
+            self._uploadDF(self._tournament_db.raw_sg_df, query, upload_dict)
         except Exception as e:
             self._logger.error('Problem uploading DF {}'.format(e), exc_info=True)
         else:
@@ -200,4 +307,4 @@ class MongoUploadDF:
 
     def _getUploadStatus(self):
         return 'Tournament DF Upload: {}\nRaw SG DF Upload: {}\n'.format(self._tournament_df_upload,
-                                                                         self._raw_sg_df_upload)
\ No newline at end of file
+                                                                         self._raw_sg_df_upload)
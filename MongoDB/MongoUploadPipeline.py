@@ -0,0 +1,98 @@
+import queue
+import threading
+import time
+
+
+class MongoUploadPipeline:
+    """Writer thread between a scrape and its MongoUploadTournament. The scraper submits player rounds as soon as
+    they are parsed and the writer upserts them while the scrape goes on, rounds waiting in the queue are coalesced
+    into one bulk write. The queue is bounded so a slow database holds the scraper back instead of piling up
+    memory. The tournament scrape status is left to the caller once closePipeline has drained the queue"""
+
+    upload_methods = {'Player Rounds': 'uploadPlayerRounds', 'Player Metadata': 'uploadPlayerMetadata',
+                      'Course Metadata': 'uploadCourseMetadata', 'Tournament Details': 'uploadTournamentDetails'}
+
+    def __init__(self, mongo_upload, called_from_logger, max_queued=64, batch_size=500):
+        """Start writer thread for mongo_upload, max_queued submissions wait before submitting blocks,
+        player rounds are written in bulk writes of up to batch_size rounds"""
+        self.mongo_upload = mongo_upload
+        self._logger = called_from_logger
+        self._batch_size = batch_size
+        self._queue = queue.Queue(maxsize=max_queued)
+        self.submitted_keys = set()
+        self.rounds_written = 0
+        self.writes = 0
+        self.errors = 0
+        self._write_time = 0.0
+        self._closed = False
+        self._writer = threading.Thread(target=self._runWriter, name='MongoUploadPipeline', daemon=True)
+        self._writer.start()
+
+    def __repr__(self):
+        return self.__class__.__name__ + ': {} player rounds streamed in {} writes taking {:.2f}s, {} errors'.format(
+            self.rounds_written, self.writes, self._write_time, self.errors)
+
+    def submitPlayerRounds(self, player_rounds):
+        """Queue MongoDB player round documents, blocks while the queue is full"""
+        if len(player_rounds) == 0:
+            return
+        self.submitted_keys.update((player_round['playerID'], player_round['roundNumber'])
+                                   for player_round in player_rounds)
+        self.submitUpload('Player Rounds', player_rounds)
+
+    def submitUpload(self, upload_type, documents):
+        """Queue documents for the MongoUploadTournament method of upload_type, e.g. 'Course Metadata'"""
+        if self._closed:
+            self._logger.error('Upload pipeline closed, dropping {} {}'.format(len(documents), upload_type))
+            return
+        self._queue.put((upload_type, list(documents) if isinstance(documents, list) else documents))
+
+    def _runWriter(self):
+        pending = None
+        while True:
+            item = pending if pending is not None else self._queue.get()
+            pending = None
+            if item is None:
+                break
+            upload_type, documents = item
+            if upload_type == 'Player Rounds':
+                # rounds that queued up while the last write ran go out in the same bulk write
+                while len(documents) < self._batch_size:
+                    try:
+                        next_item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if next_item is None or next_item[0] != 'Player Rounds':
+                        pending = next_item
+                        break
+                    documents.extend(next_item[1])
+            self._writeUpload(upload_type, documents)
+
+    def _writeUpload(self, upload_type, documents):
+        start = time.perf_counter()
+        try:
+            counts = getattr(self.mongo_upload, self.upload_methods[upload_type])(documents)
+        except Exception as e:
+            self.errors += 1
+            self._logger.error('Problem uploading {}\n{}'.format(upload_type, e), exc_info=True)
+        else:
+            # bulk writes report the operations that failed instead of raising
+            if counts is not None and counts.get('errors', 0) > 0:
+                self.errors += counts['errors']
+                self._logger.error('{} write errors uploading {}'.format(counts['errors'], upload_type))
+            self.writes += 1
+            if upload_type == 'Player Rounds':
+                self.rounds_written += len(documents)
+        self._write_time += time.perf_counter() - start
+
+    def closePipeline(self):
+        """Wait for every queued upload to be written and stop the writer, returns seconds spent waiting"""
+        if self._closed:
+            return 0.0
+        self._closed = True
+        start = time.perf_counter()
+        self._queue.put(None)
+        self._writer.join()
+        drain_time = time.perf_counter() - start
+        self._logger.info('{}, drained in {:.2f}s after the scrape\n'.format(self, drain_time))
+        return drain_time
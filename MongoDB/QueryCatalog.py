@@ -0,0 +1,125 @@
+from MongoDB.MongoDownload import MongoDownload
+
+
+class QueryCatalog:
+    """Every read and upsert lookup MongoDownload and MongoUpload send to tournament_db, filled in with sample
+    values from the database so each one can be explained. A query marked full_read reads the whole collection
+    on purpose, a collection scan is only a failure for the others"""
+
+    def __init__(self, tournament_db, tournament_name=None):
+        """Sample values come from tournament_name's latest tournament detail, or any tournament if None"""
+        self._tournament_db = tournament_db
+        detail_filter = {} if tournament_name is None else {'tournamentName': tournament_name}
+        detail = tournament_db.tournament_detail.find_one(detail_filter, sort=[('pgaYear', -1)]) or {}
+        self.tournament_name = detail.get('tournamentName', tournament_name)
+        self.tournament_id = detail.get('tournamentID')
+        self.pga_year = detail.get('pgaYear')
+        player_round = tournament_db.player_round.find_one(
+            {'tournamentID': self.tournament_id, 'pgaYear': self.pga_year}) or {}
+        self.player_id = player_round.get('playerID')
+        self.round_number = player_round.get('roundNumber')
+        self.course_id = player_round.get('courseId')
+
+    def __repr__(self):
+        return self.__class__.__name__ + ' sampled from {} {} {}'.format(self.tournament_name, self.pga_year,
+                                                                        self.tournament_id)
+
+    def getQueries(self):
+        """Return list of dicts of name, collection, filter and projection or pipeline, and full_read"""
+        tournament_key = {'tournamentID': self.tournament_id, 'pgaYear': self.pga_year}
+        df_key = {'tournamentName': self.tournament_name, 'pgaYear': self.pga_year, 'courseID': self.course_id,
+                  'roundNum': 1}
+        return [
+            # MongoDownload
+            {'name': 'tournaments_scraped', 'collection': 'tournament_scrape_status', 'filter': {},
+             'full_read': True},
+            {'name': 'tournament_details_by_year', 'collection': 'tournament_detail',
+             'filter': {'tournamentName': self.tournament_name}},
+            {'name': 'courses_by_year', 'collection': 'tournament_detail',
+             'pipeline': MongoDownload.getYearlyLookupPipeline(self.tournament_name, 'course_metadata', 'courses')},
+            {'name': 'player_rounds_by_year_course', 'collection': 'tournament_detail',
+             'pipeline': MongoDownload.getPlayerRoundsPipeline(self.tournament_name)},
+            {'name': 'sg_stats_by_year', 'collection': 'sg_stats',
+             'filter': {'tournamentName': self.tournament_name, 'pgaYear': {'$in': [self.pga_year]}},
+             'projection': {'_id': 0}},
+            {'name': 'player_names', 'collection': 'player_metadata', 'filter': {},
+             'projection': {'_id': 0, 'playerID': 1, 'firstName': 1, 'lastName': 1}, 'full_read': True},
+            {'name': 'tournament_df', 'collection': 'tournament_df',
+             'filter': {'tournamentName': self.tournament_name}, 'projection': MongoDownload.getDFProjection(None)},
+            {'name': 'tournament_df_versions', 'collection': 'tournament_df',
+             'filter': {'tournamentName': self.tournament_name},
+             'projection': {'_id': 1, 'dfVersion': 1, 'pgaYear': 1, 'courseID': 1, 'roundNum': 1}},
+            {'name': 'raw_sg_df', 'collection': 'raw_sg_df', 'filter': {'tournamentName': self.tournament_name},
+             'projection': MongoDownload.getDFProjection(None)},
+            {'name': 'raw_sg_df_versions', 'collection': 'raw_sg_df',
+             'filter': {'tournamentName': self.tournament_name},
+             'projection': {'_id': 1, 'dfVersion': 1, 'pgaYear': 1}},
+            # MongoUpload upserts, each one looks its document up by key first
+            {'name': 'known_player_ids', 'collection': 'player_metadata', 'filter': {},
+             'projection': {'playerID': 1, '_id': 0}, 'full_read': True},
+            {'name': 'player_metadata_upsert', 'collection': 'player_metadata',
+             'filter': {'playerID': self.player_id}},
+            {'name': 'tournament_detail_upsert', 'collection': 'tournament_detail', 'filter': tournament_key},
+            {'name': 'tournament_scrape_status_upsert', 'collection': 'tournament_scrape_status',
+             'filter': tournament_key},
+            {'name': 'player_round_upsert', 'collection': 'player_round',
+             'filter': dict(tournament_key, playerID=self.player_id, roundNumber=self.round_number)},
+            {'name': 'course_metadata_upsert', 'collection': 'course_metadata',
+             'filter': dict(tournament_key, courseID=self.course_id)},
+            {'name': 'sg_stats_upsert', 'collection': 'sg_stats',
+             'filter': {'playerName': '', 'tournamentName': self.tournament_name, 'pgaYear': self.pga_year}},
+            {'name': 'tournament_df_upsert', 'collection': 'tournament_df', 'filter': df_key,
+             'projection': {'dfGridFSID': 1}},
+            {'name': 'raw_sg_df_upsert', 'collection': 'raw_sg_df',
+             'filter': {'tournamentName': self.tournament_name, 'pgaYear': self.pga_year},
+             'projection': {'dfGridFSID': 1}}
+        ]
+
+    @staticmethod
+    def _walkPlan(plan, summary):
+        """Collect stages, indexes and scans from every nested plan of a find or aggregate explain"""
+        if isinstance(plan, list):
+            for item in plan:
+                QueryCatalog._walkPlan(item, summary)
+            return
+        if not isinstance(plan, dict):
+            return
+        if 'stage' in plan:
+            summary['stages'].add(plan['stage'])
+            if plan['stage'] == 'COLLSCAN':
+                summary['collection_scans'] += 1
+        if 'indexName' in plan:
+            summary['indexes'].add(plan['indexName'])
+        # $lookup stages of an aggregate explain report the plans of their inner queries as totals
+        if 'collectionScans' in plan:
+            summary['collection_scans'] += plan['collectionScans']
+            summary['indexes'].update(plan.get('indexesUsed', []))
+            summary['keys_examined'] += plan.get('totalKeysExamined', 0)
+            summary['docs_examined'] += plan.get('totalDocsExamined', 0)
+        if 'executionStats' in plan:
+            summary['keys_examined'] += plan['executionStats'].get('totalKeysExamined', 0)
+            summary['docs_examined'] += plan['executionStats'].get('totalDocsExamined', 0)
+            summary['returned'] += plan['executionStats'].get('nReturned', 0)
+            summary['millis'] += plan['executionStats'].get('executionTimeMillis', 0)
+        for key, value in plan.items():
+            # plans the planner tried and rejected don't count, only the one that ran
+            if key not in ('rejectedPlans', 'allPlansExecution') and isinstance(value, (dict, list)):
+                QueryCatalog._walkPlan(value, summary)
+
+    def explainQuery(self, query):
+        """Return summary dict of the query's executed plan, failed is True for an unexpected collection scan"""
+        collection = self._tournament_db[query['collection']]
+        if 'pipeline' in query:
+            explain = self._tournament_db.command('explain', {'aggregate': collection.name,
+                                                              'pipeline': query['pipeline'], 'cursor': {}},
+                                                  verbosity='executionStats')
+        else:
+            explain = collection.find(query['filter'], query.get('projection')).explain()
+        summary = {'stages': set(), 'indexes': set(), 'collection_scans': 0, 'keys_examined': 0,
+                   'docs_examined': 0, 'returned': 0, 'millis': 0}
+        self._walkPlan(explain, summary)
+        # an index answered the query without touching a document
+        summary['covered'] = 'FETCH' not in summary['stages'] and summary['docs_examined'] == 0 and \
+            len(summary['indexes']) > 0
+        summary['failed'] = summary['collection_scans'] > 0 and not query.get('full_read', False)
+        return summary
@@ -0,0 +1,103 @@
+import logging
+import threading
+
+from Logging.MyLogger import MyLogger
+
+
+class StaticProxySource:
+    """Proxy source returning a fixed list of 'host:port' strings, stands in for the scraped list in tests"""
+
+    def __init__(self, proxies):
+        self._proxies = list(proxies)
+
+    def __call__(self):
+        return list(self._proxies)
+
+
+class ProxyManager:
+    """Fetch proxies lazily from a pluggable source and hand out the best scoring one.
+    Score is the smoothed page load latency divided by the smoothed success rate, lower is better,
+    proxies that are too slow or fail too often are dropped and the source is re-fetched once all are gone"""
+
+    def __init__(self, proxy_source, default_latency=5.0, max_latency=20.0, max_failure_rate=.5, min_samples=3,
+                 latency_weight=.3):
+        """Initialize with a callable returning a list of 'host:port' strings, nothing is fetched until needed"""
+        self._proxy_source = proxy_source
+        self._default_latency = default_latency
+        self._max_latency = max_latency
+        self._max_failure_rate = max_failure_rate
+        self._min_samples = min_samples
+        self._latency_weight = latency_weight
+        self._proxy_stats = {}
+        self._banned_proxies = set()
+        self._lock = threading.Lock()
+        self._logger = MyLogger(self.__class__.__name__, None, logging.INFO).getLogger()
+
+    def __repr__(self):
+        return self.__class__.__name__ + ': {} usable proxies, {} dropped'.format(len(self._proxy_stats),
+                                                                              len(self._banned_proxies))
+
+    def _refreshProxies(self):
+        self._logger.info('Fetching proxies from {}'.format(self._proxy_source))
+        try:
+            proxies = self._proxy_source()
+        except Exception as e:
+            self._logger.error('Error fetching proxies\n{}'.format(e), exc_info=True)
+            proxies = []
+        # previously dropped proxies get a fresh start if the source still lists them
+        self._banned_proxies.clear()
+        for proxy in proxies:
+            self._proxy_stats.setdefault(proxy, {'latency': None, 'successes': 0, 'failures': 0})
+        self._logger.info('{} proxies available'.format(len(self._proxy_stats)))
+
+    def _getScore(self, proxy):
+        stats = self._proxy_stats[proxy]
+        latency = self._default_latency if stats['latency'] is None else stats['latency']
+        success_rate = (stats['successes'] + 1) / (stats['successes'] + stats['failures'] + 2)
+        return latency / success_rate
+
+    def _isSlowOrFailing(self, proxy):
+        stats = self._proxy_stats[proxy]
+        attempts = stats['successes'] + stats['failures']
+        if attempts < self._min_samples:
+            return False
+        return (stats['failures'] / attempts > self._max_failure_rate or
+                (stats['latency'] is not None and stats['latency'] > self._max_latency))
+
+    def getProxy(self):
+        """Return the best scoring proxy, None if the source has no proxies"""
+        with self._lock:
+            if len(self._proxy_stats) == 0:
+                self._refreshProxies()
+            if len(self._proxy_stats) == 0:
+                return None
+            return min(self._proxy_stats.keys(), key=self._getScore)
+
+    def isUsable(self, proxy):
+        """A proxy stays usable until it has been dropped for being slow or failing"""
+        return proxy is None or proxy not in self._banned_proxies
+
+    def reportResult(self, proxy, latency, success):
+        """Record an observed request through the proxy, dropping it once it scores as slow or failing"""
+        if proxy is None:
+            return
+        with self._lock:
+            stats = self._proxy_stats.get(proxy)
+            if stats is None:
+                return
+            if success:
+                stats['successes'] += 1
+                if stats['latency'] is None:
+                    stats['latency'] = latency
+                else:
+                    stats['latency'] += self._latency_weight * (latency - stats['latency'])
+            else:
+                stats['failures'] += 1
+            if self._isSlowOrFailing(proxy):
+                self._logger.info('Dropping proxy {} with stats {}'.format(proxy, stats))
+                del self._proxy_stats[proxy]
+                self._banned_proxies.add(proxy)
+
+    def getProxyStats(self):
+        with self._lock:
+            return {proxy: dict(stats, score=self._getScore(proxy)) for proxy, stats in self._proxy_stats.items()}
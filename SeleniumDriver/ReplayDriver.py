@@ -0,0 +1,63 @@
+class ReplayDriver:
+    """Stands in for both WebDriver and WireFetcher by answering every call from a TournamentRecording,
+    no browser and no network are touched"""
+
+    def __init__(self, recording, called_from_logger=None):
+        """Initialize with a TournamentRecording"""
+        self._recording = recording
+        self._class_logger = called_from_logger
+        self.request_count = 0
+
+    def updateLogLocations(self, tournament_name, file_handler):
+        pass
+
+    def updateLogger(self, called_from_logger):
+        self._class_logger = called_from_logger
+
+    def setResponseCache(self, response_cache):
+        """Replays are served from the recording only"""
+        pass
+
+    def setMetrics(self, metrics):
+        """Replays have no network or DOM to measure, only the scraper's parse times are recorded"""
+        pass
+
+    def goToURL(self, url_string):
+        pass
+
+    def waitForMetaContent(self, meta_name, error_message):
+        content = self._recording.meta_content.get(meta_name)
+        if content is None and self._class_logger is not None:
+            self._class_logger.error(error_message.format('No recorded meta content for ' + meta_name))
+        return content
+
+    def wireRequestToJSON(self, request_str, timeout=None):
+        """Take request string and return the recorded json object, '' if it was never recorded"""
+        self.request_count += 1
+        json_body = self._recording.responses.get(request_str)
+        if json_body is None:
+            if self._class_logger is not None:
+                self._class_logger.error('No recorded response for request {}'.format(request_str))
+            return ''
+        return json_body
+
+    def fetchJSON(self, url_string, use_cache=True):
+        return self.wireRequestToJSON(url_string)
+
+    def fetchManyJSON(self, url_strings, use_cache=True):
+        return {url_string: self.wireRequestToJSON(url_string) for url_string in dict.fromkeys(url_strings)}
+
+    def findElementByXPath(self, xpath, meta=False):
+        return self._recording.page_text.get(xpath, '')
+
+    def webDriverWait(self, element, EC_method, error_message):
+        return None
+
+    def getDriver(self):
+        return None
+
+    def closeDriver(self):
+        pass
+
+    def closeFetcher(self):
+        pass
@@ -1,18 +1,32 @@
+import functools
 import json
 import logging
+import os
 import re
+import shutil
+import time
 
-from selenium.common.exceptions import StaleElementReferenceException
+from selenium.common.exceptions import StaleElementReferenceException, TimeoutException
+from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import WebDriverWait, Select
 from seleniumwire import webdriver
 from webdriver_manager.chrome import ChromeDriverManager
 
+from DataScraping.ResponseCache import ResponseCache
 from Logging.MyLogger import MyLogger
+from Logging.ScrapeMetrics import ScrapeMetrics
+from SeleniumDriver.ProxyManager import ProxyManager
+
+
+@functools.lru_cache(maxsize=None)
+def getChromeDriverPath():
+    """Resolve chromedriver once per process instead of once per driver"""
+    return ChromeDriverManager().install()
 
 
 def getProxies():
-    driver = webdriver.Chrome(ChromeDriverManager().install())
+    driver = webdriver.Chrome(getChromeDriverPath())
     driver.get("https://free-proxy-list.net/")
 
     PROXIES = []
@@ -29,35 +43,50 @@ def getProxies():
     return PROXIES
 
 
-def proxyDriver(proxies):
-    if len(proxies) < 1:
-        print("--- Proxies used up (%s)" % len(proxies))
-        proxies = getProxies()
-
-    pxy = proxies[-1]
+def proxyDriver(pxy):
     chrome_options = webdriver.ChromeOptions()
-    chrome_options.add_argument('--proxy-server=https://{}'.format(pxy))
+    if pxy is None:
+        print("--- No proxies available, connecting directly")
+    else:
+        chrome_options.add_argument('--proxy-server=https://{}'.format(pxy))
     return chrome_options
 
 
 class WebDriver:
     """Initialize a Selenium Web Driver and make all calls via this class"""
-    proxy_list = getProxies()
+    # proxies are only scraped once the first driver is created, replace the source with a StaticProxySource for tests
+    proxy_manager = ProxyManager(getProxies)
+    # selenium wire only captures the JSON hosts, ads, images and analytics pass straight through
+    capture_scopes = [r'.*lbdata\.pgatour\.com.*', r'.*statdata\.pgatour\.com.*']
+    # calls of _boundCaptureStore between checks of the bytes stored
+    capture_bytes_interval = 25
 
-    def __init__(self, called_from_logger, wait_time=10, wire_time=3):
-        """Initialize new web driver using selenium"""
+    def __init__(self, called_from_logger, wait_time=10, wire_time=3, response_cache=None, max_captured=200,
+                 max_captured_bytes=64 * 1024 * 1024):
+        """Initialize new web driver using selenium, optional response cache checked before waiting on the wire,
+        the capture store is bounded to max_captured requests and max_captured_bytes of stored bodies"""
         self._wait_time = wait_time
         self._wire_time = wire_time
+        self._response_cache = response_cache
+        self._max_captured = max_captured
+        self._max_captured_bytes = max_captured_bytes
+        self.captured_evicted = 0
+        # urls read by wireRequestToJSON, later captures of them are duplicates no one waits for
+        self._consumed_urls = set()
+        self._bound_calls = 0
+        self.metrics = ScrapeMetrics()
         self._class_logger = called_from_logger
         self._selenium_logger = MyLogger('selenium.webdriver.remote.remote_connection', None,
                                          logging.INFO).getLogger()
         self._class_logger.info('Initializing New Driver...')
-        chrome_options = proxyDriver(self.proxy_list)
+        self._proxy = self.proxy_manager.getProxy()
+        chrome_options = proxyDriver(self._proxy)
         prefs = {"profile.default_content_setting_values.notifications": 2,
                  "profile.managed_default_content_settings.images": 2}
         chrome_options.add_experimental_option("prefs", prefs)
-        self._driver = webdriver.Chrome(ChromeDriverManager().install(), chrome_options=chrome_options)
+        self._driver = webdriver.Chrome(getChromeDriverPath(), chrome_options=chrome_options)
         self._driver.create_options()
+        self._driver.scopes = self.capture_scopes
 
     def updateLogLocations(self, tournament_name, file_handler):
         # selenium log kept separate from class log
@@ -66,25 +95,112 @@ class WebDriver:
         self._class_logger = MyLogger(self.__class__.__name__ + tournament_name, file_handler, logging.INFO,
                                       'a').getLogger()
 
+    def setResponseCache(self, response_cache):
+        self._response_cache = response_cache
+
+    def setMetrics(self, metrics):
+        """Record telemetry into the ScrapeMetrics of whoever is using the driver now"""
+        self.metrics = metrics
+
     def goToURL(self, url_string):
-        """Pass url for driver to get"""
+        """Pass url for driver to get, page load time is reported to score the proxy"""
+        start = time.perf_counter()
         try:
             self._driver.get(url_string)
             # self._driver.minimize_window()
+            self.proxy_manager.reportResult(self._proxy, time.perf_counter() - start, True)
         except Exception as e:
+            self.proxy_manager.reportResult(self._proxy, time.perf_counter() - start, False)
+            self.metrics.incrementCounter('errors', 'page')
             self._class_logger.error('Error loading url {}\n{}'.format(url_string, e))
+        self.metrics.observeLatency('page_load', 'page', time.perf_counter() - start)
 
     def wireRequestToJSON(self, request_str, timeout=None):
-        """Take request string and return json object from html wire"""
+        """Take request string and return json object from the response cache or the html wire"""
+        endpoint = ResponseCache.getEndpointType(request_str, 'other')
+        if self._response_cache is not None:
+            cached_json = self._response_cache.getJSON(request_str)
+            if cached_json is not None:
+                self.metrics.incrementCounter('cache_hits', endpoint)
+                return cached_json
         try:
-            if timeout is None:
-                request = self._driver.wait_for_request(request_str, timeout=self._wire_time)
-            else:
-                request = self._driver.wait_for_request(request_str, timeout=timeout)
-            return json.loads(request.response.body.decode('utf-8'))
+            with self.metrics.timeOperation('wire_wait', endpoint):
+                try:
+                    request = self._driver.wait_for_request(request_str, timeout=self._wire_time if timeout is None
+                                                            else timeout)
+                except TimeoutException:
+                    self.metrics.incrementCounter('timeouts', endpoint)
+                    raise
+            self.metrics.addBytes('wire_wait', endpoint, len(request.response.body))
+            wire_json = json.loads(request.response.body.decode('utf-8'))
+            # consumed requests are dropped so later waits don't search past them
+            self._consumed_urls.add(request.url)
+            self._evictCapturedRequests([request.id])
+            if self._response_cache is not None:
+                self._response_cache.putJSON(request_str, wire_json)
+            return wire_json
         except Exception as e:
+            self.metrics.incrementCounter('errors', endpoint)
             self._class_logger.error('Error making request {}\n{}'.format(request_str, e))
             return ''
+        finally:
+            self._boundCaptureStore()
+
+    def _getCaptureStorage(self):
+        """selenium wire's request storage, an in memory index of captured requests with bodies on disk"""
+        return self._driver.proxy.storage
+
+    def _evictCapturedRequests(self, request_ids):
+        """Remove captured requests from the store, selenium wire only exposes clearing every request"""
+        request_ids = set(request_ids)
+        try:
+            storage = self._getCaptureStorage()
+            with storage._lock:
+                storage._index[:] = [indexed for indexed in storage._index if indexed.id not in request_ids]
+            for request_id in request_ids:
+                shutil.rmtree(storage._get_request_dir(request_id), ignore_errors=True)
+            self.captured_evicted += len(request_ids)
+        except Exception as e:
+            self._class_logger.warning('Error evicting captured requests\n{}'.format(e))
+
+    def getCaptureStats(self):
+        """Return dict of captured requests held, bytes stored and requests evicted so far"""
+        try:
+            storage = self._getCaptureStorage()
+            with storage._lock:
+                num_captured = len(storage._index)
+            num_bytes = sum(os.path.getsize(os.path.join(dir_path, file_name))
+                            for dir_path, _, file_names in os.walk(storage.session_dir) for file_name in file_names)
+        except Exception as e:
+            self._class_logger.warning('Error reading capture store\n{}'.format(e))
+            return {'captured': None, 'bytes': None, 'evicted': self.captured_evicted}
+        return {'captured': num_captured, 'bytes': num_bytes, 'evicted': self.captured_evicted}
+
+    def _boundCaptureStore(self):
+        """Evict the oldest captured requests of urls already read once the store holds more than its bounds,
+        captures no one has read yet may be drawers still waited for and are kept"""
+        try:
+            storage = self._getCaptureStorage()
+            with storage._lock:
+                captured = [(indexed.id, indexed.url) for indexed in storage._index]
+        except Exception:
+            return
+        over_bounds = len(captured) > self._max_captured
+        self._bound_calls += 1
+        # walking the session dir is slow, the bytes are only checked every capture_bytes_interval calls
+        if not over_bounds and self._max_captured_bytes is not None and \
+                self._bound_calls % self.capture_bytes_interval == 0:
+            num_bytes = self.getCaptureStats()['bytes']
+            over_bounds = num_bytes is not None and num_bytes > self._max_captured_bytes
+        if not over_bounds:
+            return
+        evict_ids = [request_id for request_id, url in captured if url in self._consumed_urls]
+        if len(evict_ids) == 0:
+            self._class_logger.info('Capture store over its bounds with {} unread requests'.format(len(captured)))
+            return
+        self._class_logger.info('Capture store over its bounds, evicting {} requests already read'.format(
+            len(evict_ids)))
+        self._evictCapturedRequests(evict_ids)
 
     def findElementByXPath(self, xpath, meta=False):
         try:
@@ -96,21 +212,75 @@ class WebDriver:
             self._class_logger.error('Error pulling text from xPath {}\n{}'.format(xpath, e))
             return ''
 
+    def executeScript(self, script, error_message):
+        """Run javascript in the page and return its result in one round trip, None on failure"""
+        try:
+            return self._driver.execute_script(script)
+        except Exception as e:
+            self._class_logger.error(error_message.format(e), exc_info=True)
+            return None
+
     def webDriverWait(self, element, EC_method, error_message):
+        start = time.perf_counter()
         try:
             return WebDriverWait(element, self._wait_time).until(EC_method)
         except Exception as e:
+            self.metrics.incrementCounter('timeouts' if isinstance(e, TimeoutException) else 'errors', 'dom')
             self._class_logger.error(error_message.format(e), exc_info=True)
             return None
+        finally:
+            self.metrics.observeLatency('dom_wait', 'dom', time.perf_counter() - start)
+
+    def waitForMetaContent(self, meta_name, error_message):
+        """Wait for a meta tag by name and return its content attribute"""
+        meta_element = self.webDriverWait(self._driver,
+                                          EC.presence_of_element_located(
+                                              (By.XPATH, "//meta[@name='{}']".format(meta_name))),
+                                          error_message)
+        if meta_element is None:
+            return None
+        return meta_element.get_attribute('content')
 
     def getDriver(self):
         """Return driver object"""
         return self._driver
 
+    def isHealthy(self):
+        """Check the browser session still responds and its proxy hasn't been dropped as slow or failing"""
+        if not self.proxy_manager.isUsable(self._proxy):
+            self._class_logger.warning('Driver proxy {} was dropped, session needs replacing'.format(self._proxy))
+            return False
+        try:
+            _ = self._driver.current_url
+            return True
+        except Exception as e:
+            self._class_logger.warning('Driver session failed health check\n{}'.format(e))
+            return False
+
+    def resetSession(self):
+        """Clear captured wire requests and cookies so the next user of the session starts clean"""
+        self._class_logger.info('Capture store before reset {}'.format(self.getCaptureStats()))
+        try:
+            del self._driver.requests
+            self._consumed_urls.clear()
+            self._driver.delete_all_cookies()
+            self._driver.get('about:blank')
+            return True
+        except Exception as e:
+            self._class_logger.warning('Error resetting driver session\n{}'.format(e))
+            return False
+
     def closeDriver(self):
         """Close driver"""
         self._driver.close()
 
+    def quitDriver(self):
+        """Quit driver and end the browser process"""
+        try:
+            self._driver.quit()
+        except Exception as e:
+            self._class_logger.warning('Error quitting driver\n{}'.format(e))
+
 
 class wait_for_text_to_match(object):
     def __init__(self, locator, pattern):
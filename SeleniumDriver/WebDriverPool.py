@@ -0,0 +1,87 @@
+import contextlib
+import queue
+import threading
+
+from SeleniumDriver.WebDriver import WebDriver
+
+
+class WebDriverPool:
+    """Keep up to pool_size warm WebDriver sessions alive and lease them out one job at a time,
+    a session is recycled after max_uses leases or as soon as it fails a health check"""
+
+    def __init__(self, called_from_logger, pool_size=2, max_uses=10, driver_factory=None):
+        """Initialize pool, sessions are created lazily on first lease, driver_factory builds a new WebDriver"""
+        self._logger = called_from_logger
+        self._pool_size = pool_size
+        self._max_uses = max_uses
+        self._driver_factory = driver_factory if driver_factory is not None else WebDriver
+        self._slots = threading.Semaphore(pool_size)
+        self._idle_drivers = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._uses = {}
+        self.created = 0
+        self.recycled = 0
+
+    def __repr__(self):
+        return self.__class__.__name__ + ' size {}: {} sessions created, {} recycled, {} idle'.format(
+            self._pool_size, self.created, self.recycled, self._idle_drivers.qsize())
+
+    def _createDriver(self):
+        self._logger.info('Driver pool starting new session')
+        web_driver = self._driver_factory(self._logger)
+        with self._lock:
+            self.created += 1
+            self._uses[id(web_driver)] = 0
+        return web_driver
+
+    def _retireDriver(self, web_driver):
+        with self._lock:
+            self.recycled += 1
+            self._uses.pop(id(web_driver), None)
+        web_driver.quitDriver()
+
+    def _acquireDriver(self):
+        self._slots.acquire()
+        try:
+            while True:
+                try:
+                    web_driver = self._idle_drivers.get_nowait()
+                except queue.Empty:
+                    return self._createDriver()
+                if web_driver.isHealthy():
+                    return web_driver
+                self._retireDriver(web_driver)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _releaseDriver(self, web_driver):
+        try:
+            with self._lock:
+                self._uses[id(web_driver)] = self._uses.get(id(web_driver), 0) + 1
+                uses = self._uses[id(web_driver)]
+            if uses >= self._max_uses or not web_driver.resetSession():
+                self._logger.info('Driver pool recycling session after {} uses'.format(uses))
+                self._retireDriver(web_driver)
+            else:
+                self._idle_drivers.put(web_driver)
+        finally:
+            self._slots.release()
+
+    @contextlib.contextmanager
+    def leaseDriver(self):
+        """Lease a healthy session for the length of the with block"""
+        web_driver = self._acquireDriver()
+        try:
+            yield web_driver
+        finally:
+            self._releaseDriver(web_driver)
+
+    def closePool(self):
+        """Quit every idle session"""
+        while True:
+            try:
+                web_driver = self._idle_drivers.get_nowait()
+            except queue.Empty:
+                break
+            web_driver.quitDriver()